@@ -4,20 +4,24 @@ __license__ = 'MIT'
 
 
 import json
-import math
 from functools import partial
 from contextlib import contextmanager
 
-import maya.mel as mm
+import numpy as np
 import maya.cmds as mc
 import maya.OpenMaya as om
 import maya.OpenMayaAnim as oma
 import maya.api.OpenMaya as om2
 import maya.api.OpenMayaAnim as oma2
 
+from dwmaya.apiundo import commit
 from dwmaya.attributes import attribute_name
+from dwmaya.euler import ROTATE_ORDERS, apply_euler_continuity
 from dwmaya.hierarchy import get_parents
 from dwmaya.namespace import get_non_existing_namespace, strip_namespaces
+from dwmaya.plugs import normalize_plug_name
+from dwmaya.sampling import sample_plugs
+from dwmaya.undo import single_undo_chunk
 
 
 ANIMATION_CURVE_TYPES = (
@@ -70,6 +74,16 @@ OPEN_MAYA_TANGENT_TYPES = {
 }
 
 
+# Maximum error allowed by simplify_anim_curves, in ui units: degrees for
+# rotations, scene linear unit for translations.
+SIMPLIFY_TOLERANCES = {
+    'animCurveTA': 0.01,
+    'animCurveTL': 0.001,
+    'animCurveTT': 0.001,
+    'animCurveTU': 0.001,
+}
+
+
 def get_scene_frames():
     return list(range(
         int(mc.playbackOptions(query=True, animationStartTime=True)),
@@ -162,6 +176,77 @@ def list_non_static_anim_curves(curves=None, types=None):
     return [c.name() for c in anim_curves if not c.isStatic]
 
 
+_INTEGER_NUMERIC_TYPES = (
+    om2.MFnNumericData.kByte, om2.MFnNumericData.kChar,
+    om2.MFnNumericData.kShort, om2.MFnNumericData.kInt,
+    om2.MFnNumericData.kInt64, om2.MFnNumericData.kAddr)
+
+
+def _new_plug_value(modifier, plug, value):
+    """Set a curve value on a plug with the setter matching its type."""
+    attribute = plug.attribute()
+    if attribute.hasFn(om2.MFn.kEnumAttribute):
+        modifier.newPlugValueShort(plug, int(round(value)))
+        return
+    if attribute.hasFn(om2.MFn.kNumericAttribute):
+        numeric_type = om2.MFnNumericAttribute(attribute).numericType()
+        if numeric_type == om2.MFnNumericData.kBoolean:
+            modifier.newPlugValueBool(plug, bool(round(value)))
+            return
+        if numeric_type in _INTEGER_NUMERIC_TYPES:
+            modifier.newPlugValueInt(plug, int(round(value)))
+            return
+        if numeric_type == om2.MFnNumericData.kFloat:
+            modifier.newPlugValueFloat(plug, value)
+            return
+    modifier.newPlugValueDouble(plug, value)
+
+
+def collapse_static_anim_curves(curves=None, types=None):
+    """
+    Replace static curves by the value they hold: destination plugs are set
+    to the curve value and the curves are deleted, in a single DG modifier
+    which is one step in the Maya undo queue.
+    Referenced curves, unconnected curves and curves connected to a locked
+    plug are skipped.
+    :param list[str]|None curves: default is all the scene curves.
+    :param types: str or tuple() of str. Type of animation curves animCurveTU,
+    TA, TL
+    :return:
+        dict(
+            collapsed={curve: (value, [destination plugs])},
+            skipped={curve: reason})
+    :rtype: dict
+    """
+    types = types or ('animCurveTA', 'animCurveTL', 'animCurveTU')
+    anim_curves = curves or mc.ls(type=types)
+    modifier = om2.MDGModifier()
+    collapsed = {}
+    skipped = {}
+    for curve in node_names_to_mfn_anim_curves(anim_curves):
+        if not curve.isStatic:
+            continue
+        name = curve.name()
+        if curve.isFromReferencedFile:
+            skipped[name] = 'referenced'
+            continue
+        destinations = curve.findPlug('output', False).destinations()
+        if not destinations:
+            skipped[name] = 'unconnected'
+            continue
+        if any(plug.isLocked for plug in destinations):
+            skipped[name] = 'locked'
+            continue
+        value = curve.value(0) if curve.numKeys else 0.0
+        modifier.deleteNode(curve.object())
+        for plug in destinations:
+            _new_plug_value(modifier, plug, value)
+        collapsed[name] = value, [plug.name() for plug in destinations]
+    modifier.doIt()
+    commit(modifier.undoIt, modifier.doIt)
+    return dict(collapsed=collapsed, skipped=skipped)
+
+
 def delete_unconnected_anim_curves(types=None):
     """
     Delete all the unused animation curves found in the current maya scene.
@@ -187,6 +272,128 @@ def find_anim_curve_source(plug):
         source = mc.connectionInfo(source, sourceFromDestination=True)
 
 
+BLEND_NODE_TYPES = tuple(
+    t for t in ANIMATION_NODE_TYPES if t.startswith('animBlendNode')) + (
+    'pairBlend',)
+
+
+def _blend_node_outputs(node, input_plug):
+    """Connected output plugs of a blend node affected by the input plug."""
+    attributes = node.getAffectedAttributes(input_plug.attribute())
+    child_index = None
+    if not len(attributes) and input_plug.isChild:
+        parent = input_plug.parent()
+        for i in range(parent.numChildren()):
+            if parent.child(i) == input_plug:
+                child_index = i
+        attributes = node.getAffectedAttributes(parent.attribute())
+    outputs = []
+    for attribute in attributes:
+        plug = node.findPlug(attribute, False)
+        if plug.isChild:
+            continue  # Compound outputs are treated with their children.
+        if plug.isCompound:
+            indices = range(plug.numChildren())
+            if child_index is not None and plug.numChildren() > child_index:
+                indices = [child_index]
+            outputs.extend(plug.child(i) for i in indices)
+        else:
+            outputs.append(plug)
+    return [plug for plug in outputs if plug.isSource]
+
+
+def _list_driven_plugs(plug, visited):
+    """Destination plugs of a plug, following blend nodes downstream."""
+    driven_plugs = []
+    for destination in plug.destinations():
+        node = om2.MFnDependencyNode(destination.node())
+        if node.typeName not in BLEND_NODE_TYPES:
+            driven_plugs.append(destination)
+            continue
+        for output in _blend_node_outputs(node, destination):
+            key = _plug_path(output)
+            if key in visited:
+                continue
+            visited.add(key)
+            driven_plugs.extend(_list_driven_plugs(output, visited))
+    return driven_plugs
+
+
+def _resolve_name(name):
+    """Name used in AnimCurveIndex for a node or plug name, None if invalid."""
+    selection = om2.MSelectionList()
+    try:
+        selection.add(name)
+    except RuntimeError:
+        return None
+    if '.' in name:
+        return _plug_path(selection.getPlug(0))
+    node = selection.getDependNode(0)
+    if node.hasFn(om2.MFn.kDagNode):
+        return om2.MDagPath.getAPathTo(node).partialPathName()
+    return om2.MFnDependencyNode(node).name()
+
+
+class AnimCurveIndex(object):
+    """
+    Animated plugs and their anim curves, both ways. Curves driving a plug
+    through blend nodes (anim layers, pair blends) are listed for the plug.
+    Plug names use long attribute names and the shortest unique node path.
+    Use build_anim_curve_index to create it, and rebuild it after changing
+    the scene connections.
+    """
+    def __init__(self, curves_plugs):
+        self.curves_plugs = curves_plugs
+        self.plugs_curves = {}
+        self.nodes_curves = {}
+        for curve, plugs in curves_plugs.items():
+            for plug in plugs:
+                self.plugs_curves.setdefault(plug, []).append(curve)
+                node = plug.split('.')[0]
+                node_curves = self.nodes_curves.setdefault(node, [])
+                if curve not in node_curves:
+                    node_curves.append(curve)
+
+    def _get(self, mapping, name):
+        if name in mapping:
+            return mapping[name]
+        return mapping.get(_resolve_name(name), [])
+
+    def find_curves(self, plug):
+        """Anim curves driving the plug (directly or through blend nodes)."""
+        return list(self._get(self.plugs_curves, plug))
+
+    def find_plugs(self, curve):
+        """Plugs animated by the curve."""
+        return list(self.curves_plugs.get(curve, []))
+
+    def list_node_curves(self, node):
+        """Anim curves driving any plug of the node."""
+        return list(self._get(self.nodes_curves, node))
+
+    def list_animated_plugs(self):
+        return list(self.plugs_curves)
+
+    def list_animated_nodes(self):
+        return list(self.nodes_curves)
+
+
+def build_anim_curve_index():
+    """
+    Traverse the connections of all the scene anim curves once.
+    :rtype: AnimCurveIndex
+    """
+    curves_plugs = {}
+    iterator = om2.MItDependencyNodes(om2.MFn.kAnimCurve)
+    while not iterator.isDone():
+        curve = om2.MFnDependencyNode(iterator.thisNode())
+        output = curve.findPlug('output', False)
+        curves_plugs[curve.name()] = [
+            _plug_path(plug) for plug in _list_driven_plugs(output, set())]
+        iterator.next()
+    return AnimCurveIndex(curves_plugs)
+
+
 def copy_animation(source, destination, offset=0):
     """
     Copy animation from source to destination
@@ -285,12 +492,11 @@ def copy_position_rotation_scale(source, target):
 def motion_to_curve(transform):
     start = mc.playbackOptions(query=True, min=True)
     end = mc.playbackOptions(query=True, max=True)
-    mel_command = 'curve -d 1'
-    for frame in range(int(start), int(end) + 1):
-        mc.currentTime(frame)
-        x, y, z = mc.getAttr(transform + '.translate')[0]
-        mel_command += ' -p %f %f %f' % (x, y, z)
-    mm.eval(mel_command)
+    frames = range(int(start), int(end) + 1)
+    positions = sample_plugs(
+        [transform + '.translate'], frames, ui_units=True)
+    return mc.curve(
+        degree=1, point=[tuple(position) for position in positions[:, 0]])
 
 
 def _get_distance(p1, p2):
@@ -490,6 +696,213 @@ def import_animation(import_path):
     return failed_reconnections
 
 
+ANIMATION_ARCHIVE_VERSION = 1
+
+
+def _plug_path(plug):
+    node = plug.node()
+    if node.hasFn(om2.MFn.kDagNode):
+        node_name = om2.MDagPath.getAPathTo(node).partialPathName()
+    else:
+        node_name = om2.MFnDependencyNode(node).name()
+    attribute = plug.partialName(useFullAttributePath=True, useLongNames=True)
+    return f'{node_name}.{attribute}'
+
+
+def export_animation_archive(export_path, anim_curves=None, compress=False):
+    """
+    Export curves keys, tangents, infinity and destination plugs as NumPy
+    arrays in a .npz file. Much faster than export_animation, but animation
+    layers and blend nodes aren't exported: curves connected to them are
+    reconnected only if these exist at import.
+    Times are saved in seconds, values in internal units. Unitless input
+    curves (driven keys) are skipped: their driver isn't exported.
+    :param list[str]|None anim_curves: default is all the scene curves.
+    :param bool compress: smaller file, slower to write and read.
+    :return: skipped curves.
+    :rtype: list[str]
+    """
+    anim_curves = anim_curves or get_anim_curves()
+    mfn_anim_curves = []
+    skipped = []
+    for curve in node_names_to_mfn_anim_curves(anim_curves):
+        if curve.isUnitlessInput:
+            skipped.append(curve.name())
+            continue
+        mfn_anim_curves.append(curve)
+    seconds = om2.MTime.kSeconds
+    names, curve_types, weighted, pre_infinity, post_infinity = (
+        [], [], [], [], [])
+    key_counts = []
+    keys = {
+        key: [] for key in (
+            'times', 'values', 'in_types', 'out_types', 'in_x', 'in_y',
+            'out_x', 'out_y')}
+    tangents_locked = []
+    destinations = []
+    destination_curves = []
+    for i, curve in enumerate(mfn_anim_curves):
+        names.append(curve.name())
+        curve_types.append(curve.animCurveType)
+        weighted.append(curve.isWeighted)
+        pre_infinity.append(curve.preInfinityType)
+        post_infinity.append(curve.postInfinityType)
+        key_counts.append(curve.numKeys)
+        for k in range(curve.numKeys):
+            keys['times'].append(curve.input(k).asUnits(seconds))
+            keys['values'].append(curve.value(k))
+            keys['in_types'].append(curve.inTangentType(k))
+            keys['out_types'].append(curve.outTangentType(k))
+            # Unconverted values: restored with convertUnits=False.
+            in_x, in_y = curve.getTangentXY(k, True)
+            out_x, out_y = curve.getTangentXY(k, False)
+            keys['in_x'].append(in_x)
+            keys['in_y'].append(in_y)
+            keys['out_x'].append(out_x)
+            keys['out_y'].append(out_y)
+            tangents_locked.append(curve.tangentsLocked(k))
+        for plug in curve.findPlug('output', False).destinations():
+            destinations.append(_plug_path(plug))
+            destination_curves.append(i)
+
+    save = np.savez_compressed if compress else np.savez
+    with open(export_path, 'wb') as f:
+        save(
+            f,
+            version=ANIMATION_ARCHIVE_VERSION,
+            names=np.array(names, dtype=str),
+            curve_types=np.array(curve_types, dtype=np.int16),
+            weighted=np.array(weighted, dtype=bool),
+            pre_infinity=np.array(pre_infinity, dtype=np.int16),
+            post_infinity=np.array(post_infinity, dtype=np.int16),
+            key_counts=np.array(key_counts, dtype=np.int64),
+            tangents_locked=np.array(tangents_locked, dtype=bool),
+            destinations=np.array(destinations, dtype=str),
+            destination_curves=np.array(destination_curves, dtype=np.int64),
+            **{
+                key: np.array(
+                    values, dtype=np.int16 if key.endswith('types')
+                    else np.float64)
+                for key, values in keys.items()})
+    return skipped
+
+
+def _resolve_plugs(plug_names):
+    """Return plugs, None for the ones which don't exist."""
+    selection = om2.MSelectionList()
+    indices = []
+    for plug_name in plug_names:
+        try:
+            selection.add(plug_name)
+        except RuntimeError:
+            indices.append(None)
+            continue
+        indices.append(selection.length() - 1)
+    return [None if i is None else selection.getPlug(i) for i in indices]
+
+
+def import_animation_archive(import_path):
+    """
+    Import curves exported by export_animation_archive. Curves are created
+    and connected through a single DG modifier, replacing the existing
+    input connections of the destination plugs. Replaced curves are deleted
+    unless they are referenced or still drive other plugs. The import is
+    one step in the Maya undo queue.
+    :return: the destinations which can't be connected.
+    :rtype: list[str]
+    """
+    with np.load(import_path) as archive:
+        data = {key: archive[key] for key in archive.files}
+    if int(data['version']) > ANIMATION_ARCHIVE_VERSION:
+        raise ValueError(f'Unsupported animation archive: {import_path}')
+    ends = np.cumsum(data['key_counts'])
+    starts = ends - data['key_counts']
+    modifier = om2.MDGModifier()
+    curves = []
+    for name, curve_type in zip(data['names'], data['curve_types']):
+        curve = oma2.MFnAnimCurve()
+        modifier.renameNode(curve.create(int(curve_type), modifier), name)
+        curves.append(curve)
+    modifier.doIt()
+
+    # Keys edits aren't part of the modifier, they are recorded apart.
+    change = oma2.MAnimCurveChange()
+    seconds = om2.MTime.kSeconds
+    fixed = oma2.MFnAnimCurve.kTangentFixed
+    for i, curve in enumerate(curves):
+        start, end = starts[i], ends[i]
+        curve.setIsWeighted(bool(data['weighted'][i]), change)
+        curve.setPreInfinityType(int(data['pre_infinity'][i]), change)
+        curve.setPostInfinityType(int(data['post_infinity'][i]), change)
+        if start == end:
+            continue
+        time_array = om2.MTimeArray(end - start, om2.MTime())
+        for k, time in enumerate(data['times'][start:end]):
+            time_array[k] = om2.MTime(time, seconds)
+        curve.addKeys(
+            time_array, om2.MDoubleArray(data['values'][start:end].tolist()),
+            oma2.MFnAnimCurve.kTangentGlobal,
+            oma2.MFnAnimCurve.kTangentGlobal, False, change)
+        tangents = zip(
+            data['in_types'][start:end], data['out_types'][start:end],
+            data['in_x'][start:end], data['in_y'][start:end],
+            data['out_x'][start:end], data['out_y'][start:end])
+        for k, (in_type, out_type, in_x, in_y, out_x, out_y) in \
+                enumerate(tangents):
+            # Tangents have to be unlocked to restore broken tangents.
+            curve.setTangentsLocked(k, False, change)
+            curve.setWeightsLocked(k, False, change)
+            curve.setInTangentType(k, int(in_type), change)
+            curve.setOutTangentType(k, int(out_type), change)
+            # Exported tangents are unconverted getTangentXY values.
+            if in_type == fixed or data['weighted'][i]:
+                curve.setTangent(
+                    k, in_x, in_y, True, change, convertUnits=False)
+            if out_type == fixed or data['weighted'][i]:
+                curve.setTangent(
+                    k, out_x, out_y, False, change, convertUnits=False)
+            if data['tangents_locked'][start + k]:
+                curve.setTangentsLocked(k, True, change)
+
+    failures = []
+    # {node hash: [replaced curve, disconnected destinations count]}
+    replaced_curves = {}
+    plugs = _resolve_plugs(data['destinations'])
+    for curve_index, destination, plug in zip(
+            data['destination_curves'], data['destinations'], plugs):
+        if plug is None or plug.isLocked:
+            failures.append(str(destination))
+            continue
+        source = plug.source()
+        if not source.isNull:
+            modifier.disconnect(source, plug)
+            source_node = source.node()
+            if source_node.hasFn(om2.MFn.kAnimCurve):
+                key = om2.MObjectHandle(source_node).hashCode()
+                replaced_curves.setdefault(key, [source_node, 0])[1] += 1
+        output = curves[curve_index].findPlug('output', False)
+        modifier.connect(output, plug)
+    for node, count in replaced_curves.values():
+        replaced_curve = om2.MFnDependencyNode(node)
+        if replaced_curve.isFromReferencedFile:
+            continue
+        output = replaced_curve.findPlug('output', False)
+        if len(output.destinations()) == count:
+            modifier.deleteNode(node)
+    modifier.doIt()
+
+    def undo():
+        change.undoIt()
+        modifier.undoIt()
+
+    def redo():
+        modifier.doIt()
+        change.redoIt()
+
+    commit(undo, redo)
+    return failures
+
+
 def delete_animation_for_selected_references(exclude_selected_nodes=True):
     """Delete animation on selected namespaces"""
     selected_nodes = mc.ls(selection=True)
@@ -555,32 +968,352 @@ def get_connected_nodes(curve_name):
 
 def bake_animation(
         anim_curves, frames, skip_static_curves=True,
-        tangent_in='stepnext', tangent_out='step'):
+        tangent_in='stepnext', tangent_out='step', chunk_size=None):
     """
     This is faster than using maya.cmds.setKeyframes().
+    Frames times are built once, curves are resolved in one selection list
+    and each curve gets a single addKeys call.
 
     If a script needs to unlock animation layers, this will have to be placed
     in an evalDeferred() call :(
+
+    :param int|None chunk_size: resolve and bake curves by chunks of this
+        size, to bound memory on huge rigs.
     """
     tangent_in = OPEN_MAYA_TANGENT_TYPES[tangent_in]
     tangent_out = OPEN_MAYA_TANGENT_TYPES[tangent_out]
-    time_unit = om.MTime.uiUnit()
-    for curve_name in anim_curves:
-        om_curve = get_openmaya_curve(curve_name)
-        if om_curve.isStatic() and skip_static_curves:
-            continue
-        time_array = om.MTimeArray()
-        value_array = om.MDoubleArray()
-        for frame in frames:
-            mtime = om.MTime(frame, time_unit)
-            time_array.append(mtime)
-            value_array.append(om_curve.evaluate(mtime))
-        om_curve.addKeys(
-            time_array,
-            value_array,
-            oma.MFnAnimCurve.kTangentStepNext,
-            oma.MFnAnimCurve.kTangentStep,
-            False)
+    time_unit = om2.MTime.uiUnit()
+    frames_count = len(frames)
+    time_array = om2.MTimeArray(frames_count, om2.MTime())
+    for i, frame in enumerate(frames):
+        time_array[i] = om2.MTime(frame, time_unit)
+    times = list(time_array)
+    value_array = om2.MDoubleArray(frames_count, 0.0)
+    indices = range(frames_count)
+
+    anim_curves = list(anim_curves)
+    chunk_size = chunk_size or len(anim_curves) or 1
+    for start in range(0, len(anim_curves), chunk_size):
+        mfn_anim_curves = node_names_to_mfn_anim_curves(
+            anim_curves[start:start + chunk_size])
+        for mfn_anim_curve in mfn_anim_curves:
+            if skip_static_curves and mfn_anim_curve.isStatic:
+                continue
+            evaluate = mfn_anim_curve.evaluate
+            for i, value in zip(indices, map(evaluate, times)):
+                value_array[i] = value
+            mfn_anim_curve.addKeys(
+                time_array, value_array, tangent_in, tangent_out, False)
+
+
+def sample_anim_curves(frames, anim_curves=None):
+    """
+    Evaluate curves per destination plug, in ui units like in Maya ascii
+    files. Curves without destination are listed by their name.
+    See dwmaya.animdiff to compare the result with another animation.
+    :param list[float] frames:
+    :param list[str]|None anim_curves: default is all the scene curves.
+    :return: plugs (short node and attribute names) and values of shape
+        (plugs count, frames count).
+    :rtype: tuple[list[str], np.ndarray]
+    """
+    anim_curves = anim_curves or get_anim_curves()
+    time_unit = om2.MTime.uiUnit()
+    times = [om2.MTime(frame, time_unit) for frame in frames]
+    angle_factor = om2.MAngle.internalToUI(1.0)
+    distance_factor = om2.MDistance.internalToUI(1.0)
+    plugs = []
+    values = []
+    for curve in node_names_to_mfn_anim_curves(anim_curves):
+        curve_values = np.array(list(map(curve.evaluate, times)))
+        if curve.animCurveType == oma2.MFnAnimCurve.kAnimCurveTA:
+            curve_values *= angle_factor
+        elif curve.animCurveType == oma2.MFnAnimCurve.kAnimCurveTL:
+            curve_values *= distance_factor
+        destinations = [
+            plug.partialName(includeNodeName=True) for plug in
+            curve.findPlug('output', False).destinations()]
+        for destination in destinations or [curve.name()]:
+            plugs.append(normalize_plug_name(destination))
+            values.append(curve_values)
+    return plugs, np.array(values).reshape(len(plugs), len(times))
+
+
+def find_keys_to_keep(times, values, tolerances, counts=None, kept=None):
+    """
+    Ramer-Douglas-Peucker key reduction run on all the curves at once: the
+    key the farthest from the line joining its kept neighbours is kept,
+    segment by segment, until every key is within the tolerance.
+    Curves are piecewise linear, so the error at the keys is the maximum
+    error of the whole curve.
+    :param np.ndarray times: (curves, keys)
+    :param np.ndarray values: (curves, keys)
+    :param np.ndarray tolerances: (curves,)
+    :param np.ndarray|None counts: keys count per curve. Keys after the count
+        are padding and are ignored.
+    :param np.ndarray|None kept: keys always kept mask of shape (curves,
+        keys). First and last keys are always kept.
+    :return: keys to keep mask of shape (curves, keys).
+    :rtype: np.ndarray
+    """
+    curves_count, size = times.shape
+    if counts is None:
+        counts = np.full(curves_count, size)
+    counts = np.asarray(counts)
+    rows = np.arange(curves_count)[:, None]
+    indices = np.arange(size)
+    valid = indices < counts[:, None]
+    keep = np.zeros(times.shape, dtype=bool)
+    if kept is not None:
+        keep |= kept
+    keep[:, 0] = True
+    keep[rows[:, 0], np.maximum(counts - 1, 0)] = True
+    keep &= valid
+    tolerances = np.asarray(tolerances, dtype=np.float64)[:, None]
+    while True:
+        previous = np.maximum.accumulate(
+            np.where(keep, indices, 0), axis=1)
+        following = np.minimum.accumulate(
+            np.where(keep, indices, size - 1)[:, ::-1], axis=1)[:, ::-1]
+        start_times = times[rows, previous]
+        start_values = values[rows, previous]
+        spans = times[rows, following] - start_times
+        ratios = np.divide(
+            times - start_times, spans, out=np.zeros(times.shape),
+            where=spans != 0)
+        errors = np.abs(
+            start_values + (values[rows, following] - start_values) *
+            ratios - values)
+        errors[keep | ~valid] = 0
+        segments = rows * size + previous
+        maxima = np.zeros(curves_count * size)
+        np.maximum.at(maxima, segments.ravel(), errors.ravel())
+        additions = (errors > tolerances) & (errors == maxima[segments])
+        if not additions.any():
+            return keep
+        keep |= additions
+
+
+def find_stepped_keys_to_keep(values, tolerances, counts=None):
+    """
+    Stepped curves key reduction run on all the curves at once: a key is
+    kept when its value differs from the last kept key value by more than
+    the tolerance.
+    :param np.ndarray values: (curves, keys)
+    :param np.ndarray tolerances: (curves,)
+    :param np.ndarray|None counts: keys count per curve. Keys after the count
+        are padding and are ignored.
+    :return: keys to keep mask of shape (curves, keys).
+    :rtype: np.ndarray
+    """
+    curves_count, size = values.shape
+    if counts is None:
+        counts = np.full(curves_count, size)
+    counts = np.asarray(counts)
+    tolerances = np.asarray(tolerances, dtype=np.float64)
+    keep = np.zeros(values.shape, dtype=bool)
+    keep[:, 0] = True
+    last_values = values[:, 0].copy()
+    for index in range(1, size):
+        changed = np.abs(values[:, index] - last_values) > tolerances
+        keep[:, index] = changed
+        last_values = np.where(changed, values[:, index], last_values)
+    keep[np.arange(curves_count), np.maximum(counts - 1, 0)] = True
+    keep &= np.arange(size) < counts[:, None]
+    return keep
+
+
+def _internal_tolerance(curve_type, tolerance):
+    if curve_type == 'animCurveTA':
+        return tolerance / om2.MAngle.internalToUI(1.0)
+    if curve_type == 'animCurveTL':
+        return tolerance / om2.MDistance.internalToUI(1.0)
+    return tolerance
+
+
+def _get_interpolation(curve):
+    """
+    :return: 'linear' if all the tangents are linear, 'step' if all the out
+        tangents are stepped, None otherwise.
+    :rtype: str|None
+    """
+    keys = range(curve.numKeys)
+    linear = oma2.MFnAnimCurve.kTangentLinear
+    out_types = {curve.outTangentType(k) for k in keys}
+    if out_types == {oma2.MFnAnimCurve.kTangentStep}:
+        return 'step'
+    in_types = {curve.inTangentType(k) for k in keys}
+    if out_types == in_types == {linear}:
+        return 'linear'
+    return None
+
+
+def _read_keys(curve):
+    keys = range(curve.numKeys)
+    if curve.isUnitlessInput:
+        times = [curve.unitlessInput(k) for k in keys]
+    else:
+        times = [curve.input(k).value for k in keys]
+    return times, [curve.value(k) for k in keys]
+
+
+def simplify_anim_curves(anim_curves=None, tolerances=None, chunk_size=None):
+    """
+    Remove the keys which can be interpolated from the remaining ones,
+    within a tolerance per curve type. Meant for dense curves (baked,
+    motion capture). Only the curves whose interpolation doesn't depend on
+    the neighbour keys are simplified: linear curves (all tangents linear)
+    and stepped curves (all out tangents stepped). The result is then exact
+    and tangent types are left untouched. Other curves are skipped.
+    :param list[str]|None anim_curves: default is all the scene curves.
+    :param dict|None tolerances: {curve type: tolerance in ui units},
+        overrides SIMPLIFY_TOLERANCES.
+    :param int|None chunk_size: process curves by chunks of this size.
+    :return:
+        dict(
+            keys_before=int,
+            keys_after=int,
+            curves={curve: (keys before, keys after)},
+            skipped=[curves neither linear nor stepped])
+    :rtype: dict
+    """
+    tolerances = dict(SIMPLIFY_TOLERANCES, **(tolerances or {}))
+    anim_curves = list(anim_curves or get_anim_curves())
+    constant = oma2.MFnAnimCurve.kConstant
+    report = {}
+    skipped = []
+    chunk_size = chunk_size or len(anim_curves) or 1
+    for start in range(0, len(anim_curves), chunk_size):
+        curves = {'linear': [], 'step': []}
+        for curve in node_names_to_mfn_anim_curves(
+                anim_curves[start:start + chunk_size]):
+            if curve.numKeys <= 2:
+                continue
+            interpolation = _get_interpolation(curve)
+            if interpolation is None:
+                skipped.append(curve.name())
+                continue
+            curves[interpolation].append(curve)
+
+        for interpolation, mfn_anim_curves in curves.items():
+            if not mfn_anim_curves:
+                continue
+            counts = np.array([curve.numKeys for curve in mfn_anim_curves])
+            times = np.zeros((len(counts), counts.max()))
+            values = np.zeros(times.shape)
+            kept = np.zeros(times.shape, dtype=bool)
+            curve_tolerances = np.zeros(len(counts))
+            for i, curve in enumerate(mfn_anim_curves):
+                times[i, :counts[i]], values[i, :counts[i]] = _read_keys(
+                    curve)
+                curve_type = curve.typeName
+                curve_tolerances[i] = _internal_tolerance(
+                    curve_type, tolerances.get(curve_type, 0))
+                # Linear extrapolation follows the first and last segments.
+                kept[i, 1] = curve.preInfinityType != constant
+                kept[i, counts[i] - 2] |= curve.postInfinityType != constant
+            if interpolation == 'linear':
+                keep = find_keys_to_keep(
+                    times, values, curve_tolerances, counts, kept)
+            else:
+                keep = find_stepped_keys_to_keep(
+                    values, curve_tolerances, counts)
+            for i, curve in enumerate(mfn_anim_curves):
+                removed = np.flatnonzero(~keep[i, :counts[i]])
+                report[curve.name()] = counts[i], counts[i] - len(removed)
+                for index in removed[::-1]:
+                    curve.remove(int(index))
+    return dict(
+        keys_before=int(sum(before for before, _ in report.values())),
+        keys_after=int(sum(after for _, after in report.values())),
+        curves=report,
+        skipped=skipped)
+
+
+def _list_rotation_curves_triples(anim_curves):
+    """
+    Group rotation curves by the transform they drive.
+    :return: [(transform, [rotateX curve, rotateY curve, rotateZ curve])],
+        None for axes which aren't driven by one of the curves.
+    """
+    triples = {}
+    axes = {'rotateX': 0, 'rotateY': 1, 'rotateZ': 2}
+    for curve in node_names_to_mfn_anim_curves(anim_curves):
+        for plug in curve.findPlug('output', False).destinations():
+            axis = axes.get(plug.partialName(useLongNames=True))
+            if axis is None:
+                continue
+            node = plug.node()
+            key = om2.MObjectHandle(node).hashCode()
+            triple = triples.setdefault(key, (node, [None, None, None]))
+            triple[1][axis] = curve
+    return list(triples.values())
+
+
+def euler_filter_anim_curves(anim_curves=None):
+    """
+    Remove the rotation flips (360 degrees jumps and equivalent euler
+    solutions) of rotation curves. The X, Y and Z curves of a transform are
+    filtered together, all the transforms at once. Only key values are
+    changed, missing axes are considered as constant.
+    :param list[str]|None anim_curves: default is all the scene rotation
+        curves.
+    :return: modified curves.
+    :rtype: list[str]
+    """
+    anim_curves = anim_curves or mc.ls(type='animCurveTA')
+    triples = _list_rotation_curves_triples(anim_curves)
+    if not triples:
+        return []
+    time_unit = om2.MTime.uiUnit()
+    key_times = []
+    for _, curves in triples:
+        key_times.append(np.unique([
+            curve.input(k).asUnits(time_unit)
+            for curve in curves if curve is not None
+            for k in range(curve.numKeys)]))
+    size = max(len(times) for times in key_times)
+
+    # Padding with the last value doesn't create any discontinuity.
+    rotations = np.zeros((size, len(triples), 3))
+    rotate_orders = np.zeros(len(triples), dtype=int)
+    for i, ((node, curves), times) in enumerate(zip(triples, key_times)):
+        node = om2.MFnDependencyNode(node)
+        rotate_orders[i] = node.findPlug('rotateOrder', False).asInt()
+        rotate = node.findPlug('rotate', False)
+        mtimes = [om2.MTime(time, time_unit) for time in times]
+        for axis, curve in enumerate(curves):
+            if curve is None:
+                rotations[:, i, axis] = rotate.child(axis).asDouble()
+                continue
+            count = len(times)
+            rotations[:count, i, axis] = list(map(curve.evaluate, mtimes))
+            rotations[count:, i, axis] = rotations[count - 1, i, axis]
+
+    filtered = rotations.copy()
+    for index, rotate_order in enumerate(ROTATE_ORDERS):
+        mask = rotate_orders == index
+        if mask.any():
+            filtered[:, mask] = apply_euler_continuity(
+                rotations[:, mask], rotate_order)
+
+    modified = []
+    for i, ((_, curves), times) in enumerate(zip(triples, key_times)):
+        for axis, curve in enumerate(curves):
+            if curve is None:
+                continue
+            values = filtered[:len(times), i, axis]
+            changed = False
+            for k in range(curve.numKeys):
+                frame = np.searchsorted(
+                    times, curve.input(k).asUnits(time_unit))
+                value = values[frame]
+                if abs(curve.value(k) - value) > 1e-9:
+                    curve.setValue(k, value)
+                    changed = True
+            if changed:
+                modified.append(curve.name())
+    return modified
 
 
 def add_pre_post_roll(
@@ -588,80 +1321,174 @@ def add_pre_post_roll(
     """
     On each curve, add a key at the the preroll and post roll frames.
     Set their value to follow the tangent of the first/last key.
+    Unlike analyze_rolls and fix_rolls, which continue the motion of the
+    frames around the start and end, the keys tangents are extrapolated
+    from the first and last keys, wherever they are.
     """
     anim_curves = anim_curves or get_anim_curves()
     start = start or mc.playbackOptions(query=True, animationStartTime=True)
-    pre_frame = start - pre_frames
     end = end or mc.playbackOptions(query=True, animationEndTime=True)
-    post_frame = end + post_frames
-    time_unit = om.MTime.uiUnit()
-    for i, curve_name in enumerate(anim_curves):
-        om_curve = get_openmaya_curve(curve_name)
-        om2_curve = node_names_to_mfn_anim_curves([curve_name])[0]
-        if om_curve.isStatic():
+    time_unit = om2.MTime.uiUnit()
+    linear = oma2.MFnAnimCurve.kTangentLinear
+    for curve in node_names_to_mfn_anim_curves(anim_curves):
+        if curve.isStatic or curve.isUnitlessInput:
             continue
-
-        # Pre-roll:
-        first_frame = om_curve.time(0).value()
-        delta = first_frame - pre_frame
-        if delta > 0:
-            value = om_curve.value(0)
-            angle = om2_curve.getTangentAngleWeight(0, False)[0].value
-            if angle != 0:
-                offset = math.tan(angle) * delta
-                if om2_curve.animCurveType in ROTATION_TYPES:
-                    offset = math.radians(offset)
-                om_curve.addKey(
-                    om.MTime(pre_frame, time_unit),
-                    value - offset,
-                    oma2.MFnAnimCurve.kTangentLinear,
-                    oma2.MFnAnimCurve.kTangentLinear)
-
-        # Post-roll:
-        i = om_curve.numKeys() - 1
-        last_frame = om_curve.time(i).value()
-        delta = post_frame - last_frame
-        if delta > 0:
-            value = om_curve.value(i)
-            angle = om2_curve.getTangentAngleWeight(i, True)[0].value
-            if angle != 0:
-                offset = math.radians(math.tan(angle) * delta)
-                if om2_curve.animCurveType in ROTATION_TYPES:
-                    offset = math.radians(offset)
-                om_curve.addKey(
-                    om.MTime(post_frame, time_unit),
-                    value + offset,
-                    oma2.MFnAnimCurve.kTangentLinear,
-                    oma2.MFnAnimCurve.kTangentLinear)
+        # Post-roll first: the pre-roll key shifts the keys indices.
+        rolls = (
+            (curve.numKeys - 1, False, end + post_frames),
+            (0, True, start - pre_frames))
+        for index, in_tangent, frame in rolls:
+            key_frame = curve.input(index).asUnits(time_unit)
+            delta = frame - key_frame
+            if (delta < 0) != in_tangent or delta == 0:
+                continue
+            # Tangents are in seconds and internal units.
+            x, y = curve.getTangentXY(index, in_tangent)
+            if x == 0 or y == 0:
+                continue
+            seconds = om2.MTime(delta, time_unit).asUnits(om2.MTime.kSeconds)
+            curve.addKey(
+                om2.MTime(frame, time_unit),
+                curve.value(index) + y / x * seconds, linear, linear)
 
 
 def set_preroll_keys(first_frame=101, anim_curves=None):
     """
-    This version uses the values instead of the tangeant.
+    This version uses the values instead of the tangeant: the pre-roll frame
+    continues the motion of the first frames (see analyze_rolls).
+    :return: fixed curves.
+    :rtype: list[str]
+    """
+    report = analyze_rolls(anim_curves, first_frame, threshold=0)
+    return fix_rolls(report)
+
+
+ROLL_STATUSES = ('ok', 'missing', 'bad_slope')
+
+
+def _classify_rolls(outer_values, edge_values, inner_values, threshold):
+    """
+    Compare the roll frame value with the value extrapolated from the edge
+    and the inner frames. Arrays are one value per curve.
+    :return: ROLL_STATUSES indices and expected roll values.
+    """
+    deltas = edge_values - inner_values
+    expected = edge_values + deltas
+    bounds = np.sort(np.stack((
+        edge_values + deltas * (1 - threshold),
+        edge_values + deltas * (1 + threshold))), axis=0)
+    in_bounds = (bounds[0] <= outer_values) & (outer_values <= bounds[1])
+    still = np.abs(deltas) < 0.0001
+    statuses = np.where(
+        outer_values == edge_values, ROLL_STATUSES.index('missing'),
+        ROLL_STATUSES.index('bad_slope'))
+    statuses[still | in_bounds] = ROLL_STATUSES.index('ok')
+    return statuses, expected
+
+
+def analyze_rolls(
+        anim_curves=None, first_frame=101, last_frame=None, threshold=.5):
+    """
+    Check pre-roll (and post-roll) of all the curves at once: the value on
+    the roll frame has to continue the motion of the first (last) frames.
+    `threshold` is the allowed % off the expected roll values.
+    :param int|None last_frame: check post-roll too.
+    :return:
+        dict(
+            first_frame=int,
+            last_frame=int|None,
+            counts={'pre': {status: int}, 'post': {status: int}},
+            curves={curve: {'pre': status, 'post': status}},
+            expected={curve: {'pre': float, 'post': float}})
+        Only non ok curves are listed in curves and expected.
+    :rtype: dict
     """
-    time_unit = om.MTime.uiUnit()
     anim_curves = anim_curves or get_anim_curves()
-    for curve_name in anim_curves:
-        om_curve = get_openmaya_curve(curve_name)
-        if om_curve.isStatic():
-            continue
-        if om_curve.preInfinityType() != oma.MFnAnimCurve.kConstant:
-            continue
-        if om_curve.time(0).value() > first_frame:
-            continue  # Dont add key if there is no animation at first frame
-        pre_value = om_curve.evaluate(om.MTime(first_frame - 1, time_unit))
-        first_frame_value = om_curve.evaluate(om.MTime(first_frame, time_unit))
-        post_value = om_curve.evaluate(om.MTime(first_frame + 1, time_unit))
-        delta = post_value - first_frame_value
-        new_value = first_frame_value - delta
-        if new_value != pre_value:
-            # insert key to preserve curve shape:
-            mc.setKeyframe(curve_name, insert=True, time=[first_frame])
-            om_curve.addKey(
-                om.MTime(first_frame - 1, time_unit),
-                new_value,
-                oma2.MFnAnimCurve.kTangentLinear,
-                oma2.MFnAnimCurve.kTangentLinear)
+    mfn_anim_curves = [
+        curve for curve in node_names_to_mfn_anim_curves(anim_curves)
+        if not curve.isStatic]
+    rolls = {'pre': (first_frame - 1, first_frame, first_frame + 1)}
+    if last_frame is not None:
+        rolls['post'] = (last_frame + 1, last_frame, last_frame - 1)
+
+    time_unit = om2.MTime.uiUnit()
+    report = dict(
+        first_frame=first_frame, last_frame=last_frame, counts={},
+        curves={}, expected={})
+    names = [curve.name() for curve in mfn_anim_curves]
+    for roll, frames in rolls.items():
+        times = [om2.MTime(frame, time_unit) for frame in frames]
+        values = np.array([
+            [curve.evaluate(time) for time in times]
+            for curve in mfn_anim_curves]).reshape(-1, 3)
+        statuses, expected = _classify_rolls(*values.T, threshold)
+        report['counts'][roll] = {
+            status: int((statuses == i).sum())
+            for i, status in enumerate(ROLL_STATUSES)}
+        for i in np.flatnonzero(statuses):
+            report['curves'].setdefault(names[i], {})[roll] = (
+                ROLL_STATUSES[statuses[i]])
+            report['expected'].setdefault(names[i], {})[roll] = (
+                float(expected[i]))
+    return report
+
+
+@single_undo_chunk()
+def fix_rolls(report):
+    """
+    Key the expected roll values of the curves listed in an analyze_rolls
+    report. A key is first inserted on the first/last frame to preserve the
+    animation. Curves with pre/post infinity and curves which aren't
+    animated on the first/last frame are skipped.
+    :return: fixed curves.
+    :rtype: list[str]
+    """
+    time_unit = om2.MTime.uiUnit()
+    linear = oma2.MFnAnimCurve.kTangentLinear
+    constant = oma2.MFnAnimCurve.kConstant
+    names = list(report['expected'])
+    edits = []
+    for name, curve in zip(names, node_names_to_mfn_anim_curves(names)):
+        for roll, value in report['expected'][name].items():
+            if roll == 'pre':
+                edge_frame = report['first_frame']
+                roll_frame = edge_frame - 1
+                infinity = curve.preInfinityType
+            else:
+                edge_frame = report['last_frame']
+                roll_frame = edge_frame + 1
+                infinity = curve.postInfinityType
+            if infinity != constant:
+                continue
+            first_key, last_key = (
+                curve.input(k).asUnits(time_unit)
+                for k in (0, curve.numKeys - 1))
+            if not first_key <= edge_frame <= last_key:
+                continue
+            edits.append((name, curve, edge_frame, roll_frame, value))
+    if not edits:
+        return []
+
+    # Insert the edge keys with Maya, which splits the segment tangents to
+    # keep the curves shape.
+    for edge_frame in sorted({edit[2] for edit in edits}):
+        edge_time = om2.MTime(edge_frame, time_unit)
+        curves_to_key = sorted({
+            name for name, curve, frame, _, _ in edits
+            if frame == edge_frame and curve.find(edge_time) is None})
+        if curves_to_key:
+            mc.setKeyframe(curves_to_key, insert=True, time=edge_frame)
+
+    change = oma2.MAnimCurveChange()
+    for _, curve, _, roll_frame, value in edits:
+        roll_time = om2.MTime(roll_frame, time_unit)
+        index = curve.find(roll_time)
+        if index is None:
+            curve.addKey(roll_time, value, linear, linear, change)
+        else:
+            curve.setValue(index, value, change)
+    commit(change.undoIt, change.redoIt)
+    return sorted({edit[0] for edit in edits})
 
 
 def check_preroll(first_frame=101, threshold=.5):
@@ -671,32 +1498,12 @@ def check_preroll(first_frame=101, threshold=.5):
 
     `threshold` is the allowed % off the expected preroll values
     """
-
-    bad_curves = []
-    time_unit = om.MTime.uiUnit()
-    for curve_name in get_anim_curves():
-        om_curve = get_openmaya_curve(curve_name)
-        if om_curve.isStatic():
-            continue
-        first_frame_value = om_curve.evaluate(om.MTime(first_frame, time_unit))
-        post_value = om_curve.evaluate(om.MTime(first_frame + 1, time_unit))
-        pre_value = om_curve.evaluate(om.MTime(first_frame - 1, time_unit))
-        if first_frame_value == post_value == pre_value:
-            continue
-
-        post_delta = first_frame_value - post_value
-        if post_delta < 0.0001:
-            continue  # skip -1.734723475976807e-18
-
-        # expected_value = first_frame_value + post_delta
-        # threshold.5 = animation can be 50% faster/slower at most:
-        min_expected_value = first_frame_value + (post_delta * (1 - threshold))
-        max_expected_value = first_frame_value + (post_delta * (1 + threshold))
-        if post_delta < 0:
-            min_expected_value, max_expected_value = (
-                max_expected_value, min_expected_value)
-
-        if not min_expected_value < pre_value < max_expected_value:
-            bad_curves.append(curve_name)
-
-    return bad_curves
+    report = analyze_rolls(first_frame=first_frame, threshold=threshold)
+    curves = [
+        curve for curve, rolls in report['curves'].items() if 'pre' in rolls]
+    # Only the curves going down on the first frames are checked.
+    time = om2.MTime(first_frame, om2.MTime.uiUnit())
+    return [
+        name for name, curve in zip(
+            curves, node_names_to_mfn_anim_curves(curves))
+        if report['expected'][name]['pre'] - curve.evaluate(time) >= 0.0001]
@@ -0,0 +1,165 @@
+"""
+Numerical animation diff. Doesn't need Maya.
+
+Two animations are sampled on the same frames as (plugs, values) pairs,
+values being an array of shape (plugs count, frames count), and compared plug
+by plug. Animations come from Maya ascii files (sample_maya_ascii_animation)
+or from the live scene (dwmaya.animation.sample_anim_curves).
+Example:
+    frames = range(101, 201)
+    report = diff_animations(
+        sample_maya_ascii_animation('anim_v001.ma', frames),
+        sample_maya_ascii_animation('anim_v002.ma', frames),
+        frames)
+    report['changed']['ctrl_arm_L.rx']  # {'max_deviation': 12.5, ...}
+"""
+
+__author__ = 'Olivier Evers'
+__copyright__ = 'DreamWall'
+__license__ = 'MIT'
+
+
+import numpy as np
+
+from dwmaya.asciianimation import (
+    extract_anim_curves, get_maya_ascii_frame_rate)
+from dwmaya.curveevaluation import evaluate_anim_curves, pack_anim_curves
+from dwmaya.plugs import normalize_plug_name
+
+
+DEFAULT_TOLERANCE = 1e-4
+
+
+def sample_anim_curves_arrays(curves, frames, frame_rate=24.0):
+    """
+    Evaluate extracted curves on the given frames, per destination plug.
+    Curves without destination are listed by their name.
+    :param list[AnimCurveArrays] curves:
+    :rtype: tuple[list[str], np.ndarray]
+    """
+    curves = list(curves)
+    values = evaluate_anim_curves(
+        pack_anim_curves(curves, frame_rate), frames, frame_rate)
+    plugs = []
+    rows = []
+    for i, curve in enumerate(curves):
+        for destination in curve.destinations or [curve.name]:
+            plugs.append(normalize_plug_name(destination))
+            rows.append(i)
+    return plugs, values[rows]
+
+
+def sample_maya_ascii_animation(maya_file_path, frames):
+    """
+    :return: plugs and values of shape (plugs count, frames count).
+    :rtype: tuple[list[str], np.ndarray]
+    """
+    curves = extract_anim_curves(maya_file_path)
+    frame_rate = get_maya_ascii_frame_rate(maya_file_path)
+    return sample_anim_curves_arrays(curves.values(), frames, frame_rate)
+
+
+def _changed_ranges(changed, frames):
+    """
+    :param np.ndarray changed: boolean array of shape (plugs, frames).
+    :return: list of (first frame, last frame) per plug.
+    """
+    padded = np.zeros((changed.shape[0], changed.shape[1] + 2), dtype=bool)
+    padded[:, 1:-1] = changed
+    edges = np.diff(padded.astype(np.int8), axis=1)
+    rows, starts = np.nonzero(edges == 1)
+    _, ends = np.nonzero(edges == -1)
+    ranges = [[] for _ in range(changed.shape[0])]
+    for row, start, end in zip(rows, starts, ends - 1):
+        ranges[row].append((float(frames[start]), float(frames[end])))
+    return ranges
+
+
+def diff_animations(
+        animation_a, animation_b, frames, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compare two sampled animations.
+    :param tuple[list[str], np.ndarray] animation_a: plugs and values.
+    :param tuple[list[str], np.ndarray] animation_b: plugs and values.
+    :param list[float] frames: frames the animations are sampled on.
+    :param float tolerance: values differences ignored.
+    :return:
+        dict(
+            changed={plug: dict(max_deviation=float, frame=float,
+                                ranges=[(first frame, last frame)])},
+            added=[plugs only animated in b],
+            removed=[plugs only animated in a],
+            unchanged=int)
+    :rtype: dict
+    """
+    frames = np.asarray(frames, dtype=np.float64)
+    plugs_a, values_a = animation_a
+    plugs_b, values_b = animation_b
+    indices_a = {plug: i for i, plug in enumerate(plugs_a)}
+    indices_b = {plug: i for i, plug in enumerate(plugs_b)}
+    common = [plug for plug in indices_a if plug in indices_b]
+    rows_a = [indices_a[plug] for plug in common]
+    rows_b = [indices_b[plug] for plug in common]
+
+    if not len(frames):
+        return dict(
+            changed={},
+            added=sorted(set(indices_b) - set(indices_a)),
+            removed=sorted(set(indices_a) - set(indices_b)),
+            unchanged=len(common))
+
+    deviations = np.abs(
+        np.asarray(values_a)[rows_a] - np.asarray(values_b)[rows_b])
+    deviations = deviations.reshape(len(common), len(frames))
+    # NaN on one side only is a change, on both sides is not.
+    nan_a = np.isnan(np.asarray(values_a)[rows_a]).reshape(deviations.shape)
+    nan_b = np.isnan(np.asarray(values_b)[rows_b]).reshape(deviations.shape)
+    deviations[nan_a & nan_b] = 0
+    deviations[nan_a ^ nan_b] = np.inf
+    changed = deviations > tolerance
+    changed_rows = np.flatnonzero(changed.any(axis=1))
+    ranges = _changed_ranges(changed[changed_rows], frames)
+    worst_frames = deviations[changed_rows].argmax(axis=1)
+
+    report = dict(
+        changed={},
+        added=sorted(set(indices_b) - set(indices_a)),
+        removed=sorted(set(indices_a) - set(indices_b)),
+        unchanged=len(common) - len(changed_rows))
+    for row, worst_frame, plug_ranges in zip(
+            changed_rows, worst_frames, ranges):
+        report['changed'][common[row]] = dict(
+            max_deviation=float(deviations[row, worst_frame]),
+            frame=float(frames[worst_frame]),
+            ranges=plug_ranges)
+    return report
+
+
+def diff_maya_ascii_animations(
+        maya_file_path_a, maya_file_path_b, frames=None,
+        tolerance=DEFAULT_TOLERANCE):
+    """
+    Compare the animation of two Maya ascii files.
+    :param list[float]|None frames: default is every frame between the first
+        and the last key of both files.
+    :rtype: dict
+    """
+    curves_a = extract_anim_curves(maya_file_path_a)
+    curves_b = extract_anim_curves(maya_file_path_b)
+    frame_rate_a = get_maya_ascii_frame_rate(maya_file_path_a)
+    frame_rate_b = get_maya_ascii_frame_rate(maya_file_path_b)
+    if frames is None:
+        times = [
+            curve.times for curves in (curves_a, curves_b)
+            for curve in curves.values() if len(curve.times)]
+        if not times:
+            frames = []
+        else:
+            times = np.concatenate(times)
+            frames = np.arange(
+                np.floor(times.min()), np.ceil(times.max()) + 1)
+    animation_a = sample_anim_curves_arrays(
+        curves_a.values(), frames, frame_rate_a)
+    animation_b = sample_anim_curves_arrays(
+        curves_b.values(), frames, frame_rate_b)
+    return diff_animations(animation_a, animation_b, frames, tolerance)
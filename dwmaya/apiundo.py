@@ -0,0 +1,90 @@
+"""
+Record OpenMaya edits in the Maya undo queue.
+
+Edits made with MDGModifier or MAnimCurveChange don't go through a command,
+so Maya can't undo them. Do the edit, then commit the functions undoing and
+redoing it: an undoable command holding them is added to the undo queue.
+Example:
+    modifier = om2.MDGModifier()
+    modifier.deleteNode(node)
+    modifier.doIt()
+    commit(modifier.undoIt, modifier.doIt)
+
+This module is also the Maya plugin registering that command. commit loads
+it when needed.
+"""
+
+__author__ = 'Olivier Evers'
+__copyright__ = 'DreamWall'
+__license__ = 'MIT'
+
+
+import maya.cmds as mc
+import maya.api.OpenMaya as om2
+
+
+COMMAND_NAME = 'dwApiUndo'
+# Undo and redo functions picked by the next command call.
+_pending = None
+
+
+def maya_useNewAPI():
+    """The plugin uses the Python API 2.0."""
+
+
+class ApiUndoCommand(om2.MPxCommand):
+    def __init__(self):
+        super(ApiUndoCommand, self).__init__()
+        self.undo_function = None
+        self.redo_function = None
+
+    @staticmethod
+    def creator():
+        return ApiUndoCommand()
+
+    def doIt(self, args):
+        # Maya loads the plugin as a separate module: read the functions
+        # from the dwmaya one.
+        from dwmaya import apiundo
+        self.undo_function, self.redo_function = apiundo._pending
+        apiundo._pending = None
+
+    def undoIt(self):
+        self.undo_function()
+
+    def redoIt(self):
+        self.redo_function()
+
+    def isUndoable(self):
+        return True
+
+
+def initializePlugin(plugin):
+    om2.MFnPlugin(plugin, 'DreamWall').registerCommand(
+        COMMAND_NAME, ApiUndoCommand.creator)
+
+
+def uninitializePlugin(plugin):
+    om2.MFnPlugin(plugin).deregisterCommand(COMMAND_NAME)
+
+
+def _get_plugin_path():
+    path = __file__
+    return path[:-1] if path.endswith('.pyc') else path
+
+
+def commit(undo, redo):
+    """
+    Add an already done OpenMaya edit to the Maya undo queue.
+    :param callable undo: function undoing the edit.
+    :param callable redo: function doing the edit again.
+    """
+    global _pending
+    plugin_path = _get_plugin_path()
+    if not mc.pluginInfo(plugin_path, query=True, loaded=True):
+        mc.loadPlugin(plugin_path, quiet=True)
+    _pending = undo, redo
+    try:
+        getattr(mc, COMMAND_NAME)()
+    finally:
+        _pending = None
@@ -3,35 +3,567 @@ __copyright__ = 'DreamWall'
 __license__ = 'MIT'
 
 
-import codecs
+import os
+import re
+import math
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime as Datetime
 
 
 ENCODING = 'iso-8859-1'
+MAYA_ASCII_DATE_PREFIX = '//Last modified: '
+MAYA_ASCII_DATE_FORMAT = '%a, %b %d, %Y %I:%M:%S %p'
+# Header is usually a few KB. Scenes with hundreds of references can have
+# longer headers, those are returned with truncated=True.
+HEADER_MAX_SIZE = 2 ** 14
+# Files are read by big chunks. A statement spreading over multiple chunks is
+# carried to the next one, so memory is bounded by the biggest statement.
+CHUNK_SIZE = 2 ** 22
+# Files are split in ranges of this size to be parsed in parallel.
+PARALLEL_RANGE_SIZE = 2 ** 25
+
+# Whitespaces and comment lines, then anything but a semicolon outside of
+# quoted strings, then the statement ending semicolon. Loops are unrolled
+# (unquoted runs separated by quoted strings) so a statement without ending
+# semicolon fails in linear time:
+_STATEMENT = re.compile(
+    r'\s*(?://[^\n]*\n\s*)*'
+    r'([^";]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^";]*)*);')
+# Same pieces, to resume the scan of a statement spreading over chunks:
+_STATEMENT_START = re.compile(r'\s*(?://[^\n]*\n\s*)*')
+_STATEMENT_BODY = re.compile(r'[^";]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^";]*)*')
+_ARGUMENT_TOKENS = re.compile(
+    r'"([^"\\]*(?:\\.[^"\\]*)*)"|([^\s"]+)', re.DOTALL)
+_ESCAPED_CHARACTER = re.compile(r'\\(.)', re.DOTALL)
+_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r'}
+_FLAG = re.compile(r'-[a-zA-Z]')
+_NODE_BOUNDARY = b'\ncreateNode '
+_DROPPED_STATEMENT_END = re.compile(r'^[ \t]*;[ \t]*\r?\n?')
+
+# Flags which are not followed by a value, per command. Any other flag is
+# considered as taking a single value.
+_BOOLEAN_FLAGS = {
+    'createNode': {'-s', '-shared', '-ss', '-skipSelect'},
+    'setAttr': {'-av', '-alteredValue', '-c', '-clamp'},
+    'connectAttr': {'-na', '-nextAvailable', '-f', '-force'},
+    'file': {
+        '-r', '-reference', '-gl', '-groupLocator',
+        '-dns', '-defaultNamespace'},
+    'select': {'-ne', '-noExpand', '-add', '-r', '-replace'},
+}
+_PARSED_COMMANDS = set(_BOOLEAN_FLAGS) | {'requires', 'fileInfo'}
+
+
+CreateNode = namedtuple(
+    'CreateNode', 'offset node_type name parent shared')
+SetAttr = namedtuple(
+    'SetAttr', 'offset node plug values attribute_type flags')
+ConnectAttr = namedtuple(
+    'ConnectAttr', 'offset source destination flags')
+FileReference = namedtuple(
+    'FileReference', 'offset path namespace reference_node file_type flags')
+Requires = namedtuple(
+    'Requires', 'offset plugin version node_types data_types')
+FileInfo = namedtuple('FileInfo', 'offset key value')
+Statement = namedtuple('Statement', 'offset command arguments')
+MayaAsciiHeader = namedtuple(
+    'MayaAsciiHeader',
+    'path name last_modified codeset maya_version requires units file_info '
+    'references truncated')
+
+
+def _scan_statement_end(buffer, position):
+    """
+    Look for the semicolon ending a statement, from a position outside of
+    quoted strings.
+    :return: the semicolon index (None if the buffer ends before it) and the
+        position to resume the scan from: after the last complete string.
+    :rtype: tuple[int|None, int]
+    """
+    position = _STATEMENT_BODY.match(buffer, position).end()
+    if position < len(buffer) and buffer[position] == ';':
+        return position, position
+    return None, position
+
+
+def iterate_over_maya_ascii_statements(
+        maya_file_path, chunk_size=CHUNK_SIZE, start=0, end=None):
+    """
+    Yield (byte offset, statement) for each statement of a Maya ascii file.
+    Statements are returned without their ending ";". Comments are skipped.
+    Semicolons and escaped quotes inside strings are handled.
+    start and end allow to only parse a byte range of the file. start must be
+    a statement boundary.
+    """
+    with open(maya_file_path, 'rb') as mayascii:
+        mayascii.seek(start)
+        buffer = ''
+        buffer_offset = start
+        # Statement spreading over chunks: (start, scan position). Its scan
+        # resumes where it stopped instead of starting over.
+        pending = None
+        while True:
+            # Read as much as the pending statement so carrying it over
+            # doesn't copy it again and again.
+            read_size = max(chunk_size, len(buffer)) if pending else chunk_size
+            if end is not None:
+                read_size = min(read_size, end - buffer_offset - len(buffer))
+            chunk = mayascii.read(read_size) if read_size > 0 else b''
+            buffer += chunk.decode(ENCODING)
+            position = 0
+            while True:
+                if pending:
+                    statement_start, scan_position = pending
+                    semicolon, scan_position = _scan_statement_end(
+                        buffer, scan_position)
+                    if semicolon is None:
+                        pending = statement_start, scan_position
+                        break
+                    pending = None
+                    statement = buffer[statement_start:semicolon].rstrip()
+                    if statement:
+                        yield buffer_offset + statement_start, statement
+                    position = semicolon + 1
+                    continue
+                match = _STATEMENT.match(buffer, position)
+                if match:
+                    if chunk and match.group(1).startswith('//'):
+                        break  # Comment line not fully read yet.
+                    statement = match.group(1).rstrip()
+                    if statement:
+                        yield buffer_offset + match.start(1), statement
+                    position = match.end()
+                    continue
+                if not chunk:
+                    break
+                statement_start = _STATEMENT_START.match(
+                    buffer, position).end()
+                if len(buffer) - statement_start < 2 or buffer.startswith(
+                        '//', statement_start):
+                    break  # Statement start not read yet.
+                _, scan_position = _scan_statement_end(buffer, statement_start)
+                pending = statement_start, scan_position
+                break
+            if not chunk:
+                break
+            # Keep unfinished statement for next chunk.
+            buffer_offset += position
+            buffer = buffer[position:]
+            if pending:
+                pending = pending[0] - position, pending[1] - position
+        # Ignore last comment line ("// End of file.ma") and yield
+        # unterminated statement if any.
+        if pending:
+            statement_start = pending[0]
+        else:
+            statement_start = _STATEMENT_START.match(buffer, position).end()
+        statement = buffer[statement_start:].rstrip()
+        if statement and not statement.startswith('//'):
+            yield buffer_offset + statement_start, statement
+
+
+def rewrite_maya_ascii_file(
+        maya_file_path, output_path, function, chunk_size=CHUNK_SIZE):
+    """
+    Stream a Maya ascii file to output_path, passing each statement through
+    function(offset, statement). It returns the statement (same or modified,
+    without ";") or None to drop it. Comments and formatting are preserved.
+    """
+    if os.path.abspath(maya_file_path) == os.path.abspath(output_path):
+        raise ValueError('Cannot rewrite a Maya ascii file on itself.')
+    statements = iterate_over_maya_ascii_statements(
+        maya_file_path, chunk_size)
+    # Statements are read by the parser, what's between them (separators,
+    # comments, indentation) is read from a second file handle.
+    with open(maya_file_path, 'rb') as source, \
+            open(output_path, 'wb') as output:
+        position = 0
+        dropped = False
+        for offset, statement in statements:
+            new_statement = function(offset, statement)
+            gap = source.read(offset - position).decode(ENCODING)
+            if dropped:
+                gap = _DROPPED_STATEMENT_END.sub('', gap, count=1)
+            if new_statement is None:
+                gap = gap.rstrip(' \t')
+            output.write(gap.encode(ENCODING))
+            source.seek(len(statement), 1)
+            position = offset + len(statement)
+            dropped = new_statement is None
+            if not dropped:
+                output.write(new_statement.encode(ENCODING))
+        if dropped:
+            gap = source.read(chunk_size).decode(ENCODING)
+            gap = _DROPPED_STATEMENT_END.sub('', gap, count=1)
+            output.write(gap.encode(ENCODING))
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                break
+            output.write(chunk)
 
 
 def iterate_over_maya_ascii_lines(maya_file_path):
-    with codecs.open(maya_file_path, 'r', encoding=ENCODING) as mayascii:
-        current_line = ''
-        for line in mayascii:
-            # Skip comments and metadata
-            if line.startswith('//'):
-                continue
-            if line.startswith('applyMetadata'):
-                continue
-            line = line.strip()
-            # handle file lines not ending with ";" as single maya lines:
-            if not line.endswith(';'):
-                current_line += line
+    for _, statement in iterate_over_maya_ascii_statements(maya_file_path):
+        # Skip metadata
+        if statement.startswith('applyMetadata'):
+            continue
+        yield statement + ';'
+
+
+def unescape_maya_ascii_string(text):
+    if '\\' not in text:
+        return text
+    return _ESCAPED_CHARACTER.sub(
+        lambda match: _ESCAPES.get(match.group(1), match.group(1)), text)
+
+
+def escape_maya_ascii_string(text):
+    return (
+        text.replace('\\', '\\\\').replace('"', '\\"')
+        .replace('\n', '\\n').replace('\t', '\\t').replace('\r', '\\r'))
+
+
+def split_maya_ascii_arguments(statement):
+    """
+    Split a statement in a list of (value, is_quoted) tuples. Quoted strings
+    are unescaped and strings continued with "+" are concatenated.
+    """
+    arguments = []
+    concatenate = False
+    for quoted, word in _ARGUMENT_TOKENS.findall(statement):
+        if word:
+            if word == '+' and arguments and arguments[-1][1]:
+                concatenate = True
                 continue
-            else:
-                parts = line.split(';')
-                # yield first part:
-                yield current_line + parts[0] + ';'
-                # yield whatever is between first and last part:
-                for part in parts[1:-1]:
-                    yield part + ';'
-                # add last part is begining of next line (almost always empty):
-                current_line = parts[-1]
+            arguments.append((word, False))
+        elif concatenate:
+            arguments[-1] = (
+                arguments[-1][0] + unescape_maya_ascii_string(quoted), True)
+        else:
+            arguments.append((unescape_maya_ascii_string(quoted), True))
+        concatenate = False
+    return arguments
+
+
+def _parse_flags(command, arguments):
+    """
+    Return flags dict and positional values.
+    Repeated flags values are gathered in a list.
+    """
+    boolean_flags = _BOOLEAN_FLAGS.get(command, ())
+    flags = {}
+    positionals = []
+    arguments = iter(arguments)
+    for value, quoted in arguments:
+        if quoted or not _FLAG.match(value):
+            positionals.append(value)
+            continue
+        if value in boolean_flags:
+            flag_value = True
+        else:
+            flag_value = next(arguments, (True, False))[0]
+        if value not in flags:
+            flags[value] = flag_value
+        elif isinstance(flags[value], list):
+            flags[value].append(flag_value)
+        else:
+            flags[value] = [flags[value], flag_value]
+    return flags, positionals
+
+
+def _flag(flags, short_name, long_name, default=None):
+    return flags.get(short_name, flags.get(long_name, default))
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def parse_maya_ascii_statement(statement, offset=None, node=None):
+    """
+    Convert a raw statement (as yielded by iterate_over_maya_ascii_statements)
+    to a record: CreateNode, SetAttr, ConnectAttr, FileReference, Requires,
+    FileInfo or Statement for any other command.
+    :param str statement: Maya ascii statement without ending ";".
+    :param int offset: byte offset of the statement in its file.
+    :param str node: name of the node which setAttr are applied to.
+    """
+    command, *arguments = statement.split(None, 1)
+    arguments = split_maya_ascii_arguments(arguments[0] if arguments else '')
+    if command not in _PARSED_COMMANDS:
+        return Statement(offset, command, arguments)
+    flags, positionals = _parse_flags(command, arguments)
+
+    if command == 'setAttr':
+        plug = positionals[0] if positionals else None
+        return SetAttr(
+            offset, node, plug, positionals[1:],
+            _flag(flags, '-type', '-typ'), flags)
+
+    if command == 'createNode':
+        return CreateNode(
+            offset, positionals[0] if positionals else None,
+            _flag(flags, '-n', '-name'), _flag(flags, '-p', '-parent'),
+            bool(_flag(flags, '-s', '-shared')))
+
+    if command == 'connectAttr':
+        source, destination = (positionals + [None, None])[:2]
+        return ConnectAttr(offset, source, destination, flags)
+
+    if command == 'file':
+        return FileReference(
+            offset, positionals[-1] if positionals else None,
+            _flag(flags, '-ns', '-namespace'),
+            _flag(flags, '-rfn', '-referenceNode'),
+            _flag(flags, '-typ', '-type'), flags)
+
+    if command == 'requires':
+        plugin, version = (positionals + [None, None])[:2]
+        return Requires(
+            offset, plugin, version,
+            _as_list(_flag(flags, '-nodeType', '-nt')),
+            _as_list(_flag(flags, '-dataType', '-dt')))
+
+    if command == 'fileInfo':
+        key, value = (positionals + [None, None])[:2]
+        return FileInfo(offset, key, value)
+
+    return Statement(offset, command, arguments)
+
+
+def iterate_over_maya_ascii_records(
+        maya_file_path, chunk_size=CHUNK_SIZE, start=0, end=None,
+        parallel=False, max_workers=None):
+    """
+    Parse a Maya ascii file without Maya and yield a record per statement.
+    The current node (set by createNode or "select -ne") is tracked to fill
+    the SetAttr.node field.
+    If parallel, the file (or the start-end range) is split and parsed in
+    multiple processes. Records are yielded in the same order.
+    """
+    if parallel:
+        yield from _iterate_over_maya_ascii_records_parallel(
+            maya_file_path, chunk_size, start, end, max_workers)
+        return
+    node = None
+    statements = iterate_over_maya_ascii_statements(
+        maya_file_path, chunk_size, start, end)
+    for offset, statement in statements:
+        record = parse_maya_ascii_statement(statement, offset, node)
+        if isinstance(record, CreateNode):
+            node = record.name
+        elif isinstance(record, Statement) and record.command == 'select':
+            flags, positionals = _parse_flags('select', record.arguments)
+            if positionals:
+                node = positionals[-1]
+        yield record
+
+
+def find_maya_ascii_split_offsets(
+        maya_file_path, range_size=PARALLEL_RANGE_SIZE, start=0, end=None):
+    """
+    Return offsets splitting the file in ranges of about range_size bytes.
+    Ranges start on a top-level createNode, which is always a statement and
+    node block boundary (strings never start a line with it, long strings
+    are continued with "+").
+    :return: [start, offset, ..., end]
+    :rtype: list[int]
+    """
+    end = os.path.getsize(maya_file_path) if end is None else end
+    offsets = [start]
+    with open(maya_file_path, 'rb') as mayascii:
+        position = start + range_size
+        while position < end:
+            boundary = None
+            while boundary is None and position < end:
+                mayascii.seek(position)
+                data = mayascii.read(CHUNK_SIZE)
+                index = data.find(_NODE_BOUNDARY)
+                if index >= 0:
+                    boundary = position + index + 1
+                elif len(data) < CHUNK_SIZE:
+                    break
+                else:
+                    # Keep the end, a boundary can be cut between reads.
+                    position += len(data) - len(_NODE_BOUNDARY) + 1
+            if boundary is None or boundary >= end:
+                break
+            offsets.append(boundary)
+            position = boundary + range_size
+    offsets.append(end)
+    return offsets
+
+
+def _parse_records(arguments):
+    return list(iterate_over_maya_ascii_records(*arguments))
+
+
+def _iterate_over_maya_ascii_records_parallel(
+        maya_file_path, chunk_size=CHUNK_SIZE, start=0, end=None,
+        max_workers=None, range_size=PARALLEL_RANGE_SIZE):
+    offsets = find_maya_ascii_split_offsets(
+        maya_file_path, range_size, start, end)
+    ranges = [
+        (maya_file_path, chunk_size, range_start, range_end)
+        for range_start, range_end in zip(offsets, offsets[1:])]
+    if len(ranges) < 2:
+        yield from iterate_over_maya_ascii_records(
+            maya_file_path, chunk_size, start, end)
+        return
+    max_workers = max_workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        # Limit results waiting in memory to the ranges being parsed.
+        futures = [
+            executor.submit(_parse_records, arguments)
+            for arguments in ranges[:max_workers * 2]]
+        ranges = ranges[max_workers * 2:]
+        while futures:
+            records = futures.pop(0).result()
+            if ranges:
+                futures.append(executor.submit(_parse_records, ranges.pop(0)))
+            yield from records
+
+
+def maya_dateformat_to_datetime(maya_ascii_date):
+    """
+    Example:
+    //Last modified: Tue, May 07, 2024 11:27:08 AM
+    """
+    datetime = maya_ascii_date.split(MAYA_ASCII_DATE_PREFIX)[-1]
+    _, month, day, year, time, period = datetime.strip().split(' ')
+    datetime = f'{year} {month} {day[:-1]} {time} {period}'
+    try:
+        return Datetime.strptime(datetime, '%Y %b %d %I:%M:%S %p')
+    except:
+        print(f'Could not parse "{datetime}"')
+        raise
+
+
+def read_maya_ascii_header(maya_file_path, max_size=HEADER_MAX_SIZE):
+    """
+    Read the header of a Maya ascii file: comments, references, requires,
+    currentUnit and fileInfo. Reading stops at the first created node and
+    never reads more than max_size bytes.
+    :rtype: MayaAsciiHeader
+    """
+    with open(maya_file_path, 'rb') as mayascii:
+        data = mayascii.read(max_size).decode(ENCODING)
+    comments = {}
+    position = 0
+    for line in data.splitlines(True):
+        if not line.startswith('//'):
+            break
+        position += len(line)
+        if not line.endswith('\n'):
+            break
+        key, _, value = line[2:].partition(':')
+        if value:
+            comments[key.strip()] = value.strip()
+        elif line.startswith('//Maya ASCII'):
+            comments['Maya ASCII'] = line.split()[2]
+
+    last_modified = None
+    if comments.get('Last modified'):
+        try:
+            last_modified = maya_dateformat_to_datetime(
+                comments['Last modified'])
+        except ValueError:
+            pass
+
+    requires = []
+    units = {}
+    file_info = {}
+    references = []
+    truncated = True
+    match = _STATEMENT.match(data, position)
+    while match:
+        statement = match.group(1).strip()
+        command = statement.split(None, 1)[0] if statement else ''
+        if command not in ('file', 'requires', 'fileInfo', 'currentUnit'):
+            truncated = False
+            break
+        record = parse_maya_ascii_statement(statement)
+        if isinstance(record, Requires):
+            requires.append((record.plugin, record.version))
+        elif isinstance(record, FileInfo):
+            file_info[record.key] = record.value
+        elif isinstance(record, FileReference):
+            if '-r' in record.flags or '-reference' in record.flags:
+                references.append((record.path, record.namespace))
+        else:
+            flags, _ = _parse_flags(command, record.arguments)
+            units = dict(
+                linear=_flag(flags, '-l', '-linear'),
+                angle=_flag(flags, '-a', '-angle'),
+                time=_flag(flags, '-t', '-time'))
+        match = _STATEMENT.match(data, match.end())
+    else:
+        # Whole file read:
+        truncated = len(data) >= max_size
+
+    maya_version = dict(requires).get('maya') or comments.get('Maya ASCII')
+    return MayaAsciiHeader(
+        path=maya_file_path,
+        name=comments.get('Name'),
+        last_modified=last_modified,
+        codeset=comments.get('Codeset'),
+        maya_version=maya_version,
+        requires=requires,
+        units=units,
+        file_info=file_info,
+        references=references,
+        truncated=truncated)
+
+
+def _read_header(arguments):
+    path, max_size = arguments
+    try:
+        return read_maya_ascii_header(path, max_size)
+    except OSError:
+        return None
+
+
+def read_maya_ascii_headers(
+        maya_file_paths, max_size=HEADER_MAX_SIZE, max_workers=None):
+    """
+    Read many headers using a thread pool (this is IO bound).
+    Unreadable files get None.
+    :rtype: dict[str, MayaAsciiHeader|None]
+    """
+    max_workers = max_workers or min(32, (os.cpu_count() or 1) * 4)
+    arguments = [(path, max_size) for path in maya_file_paths]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        headers = executor.map(_read_header, arguments)
+        return dict(zip(maya_file_paths, headers))
+
+
+def list_maya_ascii_files(directory, recursive=True):
+    paths = []
+    directories = [directory]
+    while directories:
+        try:
+            entries = list(os.scandir(directories.pop()))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if recursive:
+                    directories.append(entry.path)
+            elif entry.name.lower().endswith('.ma'):
+                paths.append(entry.path.replace('\\', '/'))
+    return sorted(paths)
+
+
+def collect_maya_ascii_headers(
+        directory, recursive=True, max_size=HEADER_MAX_SIZE,
+        max_workers=None):
+    """Read headers of all the Maya ascii files found in a directory tree."""
+    paths = list_maya_ascii_files(directory, recursive)
+    return read_maya_ascii_headers(paths, max_size, max_workers)
 
 
 def get_line_path(line):
@@ -48,3 +580,259 @@ def get_line_path(line):
     if path.endswith('.ma') and not line.startswith('file -r '):
         return
     return path
+
+
+def matrix_to_transform_attributes(matrix):
+    """
+    Decompose a Maya matrix (row vectors, translation in the last row) in
+    translate, rotate (degrees, xyz rotate order) and scale. Shear is lost.
+    :param list[float]|list[list[float]] matrix: flat or 4x4 matrix.
+    :rtype: dict[str, tuple[float, float, float]]
+    """
+    if len(matrix) == 4:
+        matrix = [value for row in matrix for value in row]
+    rows = [matrix[i * 4:i * 4 + 3] for i in range(3)]
+    scale = [math.sqrt(sum(v * v for v in row)) for row in rows]
+    determinant = (
+        rows[0][0] * (rows[1][1] * rows[2][2] - rows[1][2] * rows[2][1]) -
+        rows[0][1] * (rows[1][0] * rows[2][2] - rows[1][2] * rows[2][0]) +
+        rows[0][2] * (rows[1][0] * rows[2][1] - rows[1][1] * rows[2][0]))
+    if determinant < 0:
+        scale[0] = -scale[0]
+    rows = [[v / (s or 1) for v in row] for row, s in zip(rows, scale)]
+    y = math.asin(max(-1.0, min(1.0, -rows[0][2])))
+    if abs(math.cos(y)) > 1e-6:
+        x = math.atan2(rows[1][2], rows[2][2])
+        z = math.atan2(rows[0][1], rows[0][0])
+    else:  # Gimbal lock
+        x = math.atan2(-rows[2][1], rows[1][1])
+        z = 0.0
+    return dict(
+        translate=tuple(matrix[12:15]),
+        rotate=tuple(math.degrees(v) for v in (x, y, z)),
+        scale=tuple(scale))
+
+
+def format_maya_ascii_value(value):
+    if isinstance(value, bool):
+        return 'yes' if value else 'no'
+    if isinstance(value, str):
+        return f'"{escape_maya_ascii_string(value)}"'
+    return repr(value)
+
+
+def _values_type(values):
+    if len(values) in (2, 3) and all(
+            isinstance(v, (int, float)) and not isinstance(v, bool)
+            for v in values):
+        return f'double{len(values)}'
+    if len(values) == 1 and isinstance(values[0], str):
+        return 'string'
+    return None
+
+
+class MayaAsciiWriter(object):
+    """
+    Write a Maya ascii scene without Maya, statement by statement.
+    Header data (references, requires, units, file info) must be given
+    before the first node. The file is written next to the destination and
+    moved when closed.
+    Example:
+        with MayaAsciiWriter('layout.ma') as writer:
+            writer.add_reference('/assets/tree.ma', 'tree001')
+            writer.add_transform('set:trees', matrix=matrix)
+    """
+    def __init__(
+            self, maya_file_path, maya_version='2022', units=None,
+            file_info=None):
+        self.maya_file_path = maya_file_path
+        self.maya_version = maya_version
+        self.units = dict(linear='centimeter', angle='degree', time='film')
+        self.units.update(units or {})
+        self.file_info = dict(file_info or {})
+        self.references = []
+        self.requires = []
+        self.namespaces = set()
+        self.header_written = False
+        self._reference_nodes = set()
+        self._temp_path = f'{maya_file_path}.{os.getpid()}.tmp'
+        self._stream = open(
+            self._temp_path, 'w', encoding=ENCODING, newline='\n')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, *_):
+        if exception_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _check_header(self):
+        if self.header_written:
+            raise ValueError('Header data must be given before any node.')
+
+    def add_requires(self, plugin, version, node_types=None):
+        self._check_header()
+        self.requires.append((plugin, version, node_types or []))
+
+    def add_reference(
+            self, path, namespace, reference_node=None, deferred=True,
+            file_type=None, set_attrs=None):
+        """
+        :param str path: referenced file.
+        :param str namespace:
+        :param str|None reference_node: default is namespace + "RN".
+        :param bool deferred: write the reference unloaded.
+        :param str|None file_type: default is guessed from the extension.
+        :param list[tuple]|None set_attrs:
+            (node, attribute, values) reference edits, e.g.:
+            [('|tree001:root', 'translate', (10, 0, 5))]
+        :return: reference node name.
+        """
+        self._check_header()
+        if not reference_node:
+            reference_node = namespace.replace(':', '_') + 'RN'
+        name, number = reference_node, 1
+        while reference_node in self._reference_nodes:
+            reference_node = f'{name}{number}'
+            number += 1
+        self._reference_nodes.add(reference_node)
+        if not file_type:
+            extension = os.path.splitext(path)[-1].lower()
+            file_type = {
+                '.ma': 'mayaAscii', '.mb': 'mayaBinary', '.abc': 'Alembic',
+                '.fbx': 'FBX'}.get(extension, 'mayaAscii')
+        self.references.append(
+            (path, namespace, reference_node, deferred, file_type,
+             set_attrs or []))
+        return reference_node
+
+    def write_header(self):
+        if self.header_written:
+            return
+        self.header_written = True
+        name = os.path.basename(self.maya_file_path)
+        date = Datetime.now().strftime(MAYA_ASCII_DATE_FORMAT)
+        self._write(
+            f'//Maya ASCII {self.maya_version} scene\n'
+            f'//Name: {name}\n'
+            f'{MAYA_ASCII_DATE_PREFIX}{date}\n'
+            '//Codeset: 1252\n')
+        for flag in ('-rdi 1', '-r'):
+            for path, namespace, reference_node, deferred, file_type, _ in \
+                    self.references:
+                deferred = ' -dr 1' if deferred else ''
+                self._write_statement(
+                    f'file {flag} -ns {format_maya_ascii_value(namespace)}'
+                    f'{deferred} -rfn "{reference_node}" -typ "{file_type}" '
+                    f'{format_maya_ascii_value(path)}')
+        self._write_statement(f'requires maya "{self.maya_version}"')
+        for plugin, version, node_types in self.requires:
+            flags = ''.join(f'-nodeType "{t}" ' for t in node_types)
+            self._write_statement(
+                f'requires {flags}"{plugin}" "{version}"')
+        self._write_statement(
+            'currentUnit -l {linear} -a {angle} -t {time}'.format(
+                **self.units))
+        for key, value in self.file_info.items():
+            self._write_statement(
+                f'fileInfo {format_maya_ascii_value(key)} '
+                f'{format_maya_ascii_value(value)}')
+        for reference in self.references:
+            self._write_reference_node(*reference)
+
+    def _write_reference_node(
+            self, path, namespace, reference_node, deferred, file_type,
+            set_attrs):
+        self.create_node('reference', reference_node)
+        lines = [
+            'setAttr ".ed" -type "dataReferenceEdits" ',
+            f'"{reference_node}"']
+        if set_attrs:
+            lines.append(f'"{reference_node}" {len(set_attrs)}')
+        for node, attribute, values in set_attrs:
+            values = values if isinstance(values, (list, tuple)) else [values]
+            arguments = ' '.join(format_maya_ascii_value(v) for v in values)
+            attribute_type = _values_type(values)
+            if attribute_type:
+                arguments = f'-type "{attribute_type}" {arguments}'
+            lines.append(
+                f'2 "{escape_maya_ascii_string(node)}" "{attribute}" '
+                f'"{escape_maya_ascii_string(" " + arguments)}"')
+        self._write_statement('\n\t\t'.join(lines), indent=True)
+        self._write_statement('lockNode -l 1 ')
+
+    def _write(self, text):
+        self._stream.write(text)
+
+    def _write_statement(self, statement, indent=False):
+        self._stream.write(('\t' if indent else '') + statement + ';\n')
+
+    def _add_namespace(self, name):
+        namespace = name.split('|')[-1].rpartition(':')[0].lstrip(':')
+        parent = ':'
+        for part in namespace.split(':') if namespace else []:
+            full_name = f'{parent.rstrip(":")}:{part}'
+            if full_name not in self.namespaces:
+                self.namespaces.add(full_name)
+                self._write_statement(
+                    f'namespace -add "{part}" -p "{parent}"')
+            parent = full_name
+
+    def create_node(self, node_type, name, parent=None, shared=False):
+        self.write_header()
+        self._add_namespace(name)
+        flags = ' -s' if shared else ''
+        flags += f' -n "{name}"'
+        if parent:
+            flags += f' -p "{parent}"'
+        self._write_statement(f'createNode {node_type}{flags}')
+        return name
+
+    def set_attr(self, plug, *values, attribute_type=None):
+        """Set attribute of the last created node."""
+        attribute_type = attribute_type or _values_type(values)
+        type_flag = f' -type "{attribute_type}"' if attribute_type else ''
+        values = ' '.join(format_maya_ascii_value(v) for v in values)
+        self._write_statement(
+            f'setAttr "{plug}"{type_flag} {values}', indent=True)
+
+    def connect_attr(self, source, destination):
+        self.write_header()
+        self._write_statement(f'connectAttr "{source}" "{destination}"')
+
+    def add_transform(
+            self, name, parent=None, matrix=None, translate=None,
+            rotate=None, scale=None):
+        """
+        Create a transform. Default values are not written.
+        :param list|None matrix: flat or 4x4, overrides translate, rotate and
+            scale.
+        """
+        if matrix is not None:
+            attributes = matrix_to_transform_attributes(matrix)
+            translate = attributes['translate']
+            rotate = attributes['rotate']
+            scale = attributes['scale']
+        self.create_node('transform', name, parent)
+        for plug, values, default in (
+                ('.t', translate, 0), ('.r', rotate, 0), ('.s', scale, 1)):
+            if values is None:
+                continue
+            values = [float(v) for v in values]
+            if any(abs(v - default) > 1e-9 for v in values):
+                self.set_attr(plug, *values, attribute_type='double3')
+        return name
+
+    def close(self):
+        self.write_header()
+        name = os.path.basename(self.maya_file_path)
+        self._write(f'// End of {name}\n')
+        self._stream.close()
+        os.replace(self._temp_path, self.maya_file_path)
+
+    def abort(self):
+        self._stream.close()
+        if os.path.exists(self._temp_path):
+            os.remove(self._temp_path)
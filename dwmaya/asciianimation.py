@@ -0,0 +1,239 @@
+"""
+Offline animation curves extraction from Maya ascii files. Doesn't need Maya.
+
+Keys are stored in animCurveT* node blocks:
+    createNode animCurveTL -n "pCube1_translateX";
+        setAttr ".tan" 18;
+        setAttr ".wgt" no;
+        setAttr -s 3 ".ktv[0:2]"  1 0 10 5 20 0;
+        setAttr -s 3 ".kit[0:2]"  1 18 2;
+        setAttr -s 3 ".kix[0:2]"  1 0.3 1;
+    ...
+    connectAttr "pCube1_translateX.o" "pCube1.tx";
+Each curve is returned as NumPy arrays (one value per key).
+Example:
+    curves = extract_anim_curves('sh010_anim.ma')
+    curves['pCube1_translateX'].values.max()
+"""
+
+__author__ = 'Olivier Evers'
+__copyright__ = 'DreamWall'
+__license__ = 'MIT'
+
+
+import re
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from dwmaya.ascii import (
+    CHUNK_SIZE, iterate_over_maya_ascii_statements,
+    parse_maya_ascii_statement, read_maya_ascii_header,
+    split_maya_ascii_arguments)
+
+
+TIME_ANIM_CURVE_TYPES = (
+    'animCurveTA', 'animCurveTL', 'animCurveTT', 'animCurveTU')
+# Tangent types enum as saved in Maya ascii files.
+TANGENT_TYPES = {
+    0: 'global',
+    1: 'fixed',
+    2: 'linear',
+    3: 'flat',
+    5: 'step',
+    6: 'slow',
+    7: 'fast',
+    9: 'smooth',
+    10: 'clamped',
+    16: 'plateau',
+    17: 'stepnext',
+    18: 'auto',
+}
+INFINITY_TYPES = {
+    0: 'constant',
+    1: 'linear',
+    3: 'cycle',
+    4: 'cycleRelative',
+    5: 'oscillate',
+}
+TIME_UNIT_FRAME_RATES = {
+    'game': 15.0,
+    'film': 24.0,
+    'pal': 25.0,
+    'ntsc': 30.0,
+    'show': 48.0,
+    'palf': 50.0,
+    'ntscf': 60.0,
+    'millisec': 1000.0,
+    'sec': 1.0,
+}
+DEFAULT_TANGENT_TYPE = 18
+_KEY_ATTRIBUTES = ('ktv', 'kit', 'kot', 'kix', 'kiy', 'kox', 'koy')
+_CURVE_ATTRIBUTES = {'tan', 'wgt', 'pre', 'pst'}
+_KEY_PLUG = re.compile(r'\.(\w+)(?:\[(\d+)(?::(\d+))?\])?$')
+_FPS_UNIT = re.compile(r'([\d.]+)fps$')
+_BOOLEANS = {'yes': 1.0, 'on': 1.0, 'true': 1.0, 'no': 0.0, 'off': 0.0,
+             'false': 0.0}
+
+
+AnimCurveArrays = namedtuple(
+    'AnimCurveArrays',
+    'name node_type times values in_tangent_types out_tangent_types '
+    'in_x in_y out_x out_y weighted pre_infinity post_infinity '
+    'destinations')
+
+
+def get_maya_ascii_frame_rate(maya_file_path):
+    """Frames per second of the scene time unit (keys times unit)."""
+    time_unit = read_maya_ascii_header(maya_file_path).units.get('time')
+    time_unit = time_unit or 'film'
+    if time_unit in TIME_UNIT_FRAME_RATES:
+        return TIME_UNIT_FRAME_RATES[time_unit]
+    match = _FPS_UNIT.match(time_unit)
+    if not match:
+        raise ValueError(f'Unknown time unit: {time_unit}')
+    return float(match.group(1))
+
+
+def get_tangent_angles(curve, in_tangent=True):
+    """
+    Tangent angles (degrees) of stored tangents, NaN where the tangent is
+    computed by Maya from the tangent type.
+    """
+    x, y = (curve.in_x, curve.in_y) if in_tangent else (
+        curve.out_x, curve.out_y)
+    return np.degrees(np.arctan2(y, x))
+
+
+def get_tangent_weights(curve, in_tangent=True):
+    x, y = (curve.in_x, curve.in_y) if in_tangent else (
+        curve.out_x, curve.out_y)
+    return np.hypot(x, y)
+
+
+def _parse_values(text):
+    words = text.split()
+    try:
+        return np.array(words, dtype=np.float64)
+    except ValueError:
+        return np.array([_BOOLEANS.get(w, w) for w in words], np.float64)
+
+
+class _CurveBlock(object):
+    def __init__(self, name, node_type):
+        self.name = name
+        self.node_type = node_type
+        self.attributes = {}
+        self.ranges = {attribute: [] for attribute in _KEY_ATTRIBUTES}
+
+    def add_set_attr(self, statement):
+        quote_start = statement.find('"')
+        quote_end = statement.find('"', quote_start + 1)
+        match = _KEY_PLUG.match(statement[quote_start + 1:quote_end])
+        if not match:
+            return
+        attribute, start, _ = match.groups()
+        if attribute in _CURVE_ATTRIBUTES:
+            self.attributes[attribute] = _parse_values(
+                statement[quote_end + 1:])[0]
+        elif attribute in self.ranges and start is not None:
+            values = _parse_values(statement[quote_end + 1:])
+            self.ranges[attribute].append((int(start), values))
+
+    def _array(self, attribute, size, width=1, default=np.nan):
+        array = np.full(size * width, default, dtype=np.float64)
+        for start, values in self.ranges[attribute]:
+            start *= width
+            values = values[:max(0, size * width - start)]
+            array[start:start + len(values)] = values
+        return array
+
+    def to_arrays(self, destinations):
+        size = max(
+            (start + len(values) // 2 for start, values in self.ranges['ktv']),
+            default=0)
+        keys = self._array('ktv', size, width=2).reshape(size, 2)
+        tangent_type = int(self.attributes.get('tan', DEFAULT_TANGENT_TYPE))
+        in_types = self._array('kit', size, default=tangent_type)
+        out_types = self._array('kot', size, default=tangent_type)
+        return AnimCurveArrays(
+            name=self.name,
+            node_type=self.node_type,
+            times=keys[:, 0].copy(),
+            values=keys[:, 1].copy(),
+            in_tangent_types=in_types.astype(np.int16),
+            out_tangent_types=out_types.astype(np.int16),
+            in_x=self._array('kix', size),
+            in_y=self._array('kiy', size),
+            out_x=self._array('kox', size),
+            out_y=self._array('koy', size),
+            weighted=bool(self.attributes.get('wgt', 0)),
+            pre_infinity=INFINITY_TYPES.get(
+                int(self.attributes.get('pre', 0)), 'constant'),
+            post_infinity=INFINITY_TYPES.get(
+                int(self.attributes.get('pst', 0)), 'constant'),
+            destinations=destinations)
+
+
+def extract_anim_curves(
+        maya_file_path, node_types=TIME_ANIM_CURVE_TYPES,
+        chunk_size=CHUNK_SIZE):
+    """
+    Read all the time based animation curves of a Maya ascii file.
+    Times are in the scene time unit, see get_maya_ascii_frame_rate.
+    Tangents x/y are NaN when not stored in the file (computed by Maya
+    from the tangent type).
+    :rtype: dict[str, AnimCurveArrays]
+    """
+    blocks = {}
+    destinations = {}
+    block = None
+    statements = iterate_over_maya_ascii_statements(
+        maya_file_path, chunk_size)
+    for offset, statement in statements:
+        if statement.startswith('setAttr'):
+            if block:
+                block.add_set_attr(statement)
+            continue
+        if statement.startswith(('rename', 'addAttr', 'lockNode')):
+            continue
+        block = None
+        if statement.startswith('createNode'):
+            record = parse_maya_ascii_statement(statement, offset)
+            if record.node_type in node_types:
+                block = _CurveBlock(record.name, record.node_type)
+                blocks[record.name] = block
+        elif statement.startswith('connectAttr'):
+            arguments = split_maya_ascii_arguments(statement[11:])
+            plugs = [a for a, quoted in arguments if quoted]
+            if len(plugs) < 2:
+                continue
+            source, destination = plugs[:2]
+            node, _, attribute = source.partition('.')
+            if node in blocks and attribute in ('o', 'output'):
+                destinations.setdefault(node, []).append(destination)
+    return {
+        name: block.to_arrays(destinations.get(name, []))
+        for name, block in blocks.items()}
+
+
+def _extract(arguments):
+    maya_file_path, node_types = arguments
+    try:
+        return extract_anim_curves(maya_file_path, node_types)
+    except (OSError, ValueError) as e:
+        return {'error': str(e)}
+
+
+def extract_anim_curves_from_files(
+        maya_file_paths, node_types=TIME_ANIM_CURVE_TYPES, max_workers=None):
+    """
+    Extract animation curves of many Maya ascii files in parallel processes.
+    Unreadable files get {'error': message}.
+    :rtype: dict[str, dict[str, AnimCurveArrays]]
+    """
+    arguments = [(path, node_types) for path in maya_file_paths]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return dict(zip(
+            maya_file_paths, executor.map(_extract, arguments, chunksize=4)))
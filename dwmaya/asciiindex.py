@@ -0,0 +1,250 @@
+"""
+Sidecar byte offset index for Maya ascii files.
+
+The index stores where each node block (createNode or "select -ne" followed
+by its setAttr/addAttr/...) and each reference statement start and end in the
+file. Queries on an indexed file only read the concerned bytes.
+The index is stored next to the scene and is rebuilt as soon as the scene
+size or modification time changes.
+"""
+
+__author__ = 'Olivier Evers'
+__copyright__ = 'DreamWall'
+__license__ = 'MIT'
+
+
+import os
+import gzip
+import json
+from collections import namedtuple
+
+from dwmaya.ascii import (
+    CHUNK_SIZE, FileReference, SetAttr,
+    iterate_over_maya_ascii_records, iterate_over_maya_ascii_statements,
+    parse_maya_ascii_statement)
+
+
+INDEX_EXTENSION = '.dwidx'
+INDEX_VERSION = 1
+# Statements following a createNode which belongs to the node block:
+NODE_BLOCK_COMMANDS = ('setAttr', 'addAttr', 'rename', 'lockNode')
+
+
+NodeEntry = namedtuple(
+    'NodeEntry', 'name node_type parent namespace start end')
+ReferenceEntry = namedtuple(
+    'ReferenceEntry', 'path namespace reference_node start end')
+
+
+def get_index_path(maya_file_path):
+    return maya_file_path + INDEX_EXTENSION
+
+
+def _file_signature(maya_file_path):
+    stat = os.stat(maya_file_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _namespace(node_name):
+    if not node_name or ':' not in node_name:
+        return None
+    return node_name.split('|')[-1].rpartition(':')[0].lstrip(':') or None
+
+
+class MayaAsciiIndex(object):
+    def __init__(self, maya_file_path, size, mtime, nodes, references):
+        self.maya_file_path = maya_file_path
+        self.size = size
+        self.mtime = mtime
+        self.nodes = nodes
+        self.references = references
+        self._nodes_by_name = {}
+        for node in nodes:
+            self._nodes_by_name.setdefault(node.name, []).append(node)
+
+    def is_up_to_date(self):
+        try:
+            signature = _file_signature(self.maya_file_path)
+        except OSError:
+            return False
+        return signature == (self.size, self.mtime)
+
+    def find_nodes(self, name, parent=None):
+        """
+        Return node entries matching given name. A "parent|name" path can be
+        used to differentiate nodes with non unique names.
+        """
+        if '|' in name:
+            parent, name = name.rsplit('|', 1)
+        nodes = self._nodes_by_name.get(name, [])
+        if parent is None:
+            return nodes
+        parent = parent.split('|')[-1]
+        return [n for n in nodes if (n.parent or '').split('|')[-1] == parent]
+
+    def list_nodes(self, node_type=None, namespace=None):
+        return [
+            n for n in self.nodes
+            if (node_type is None or n.node_type == node_type) and
+            (namespace is None or n.namespace == namespace)]
+
+    def to_dict(self):
+        return dict(
+            version=INDEX_VERSION,
+            size=self.size,
+            mtime=self.mtime,
+            nodes=[list(n) for n in self.nodes],
+            references=[list(r) for r in self.references])
+
+    @classmethod
+    def from_dict(cls, maya_file_path, data):
+        return cls(
+            maya_file_path, data['size'], data['mtime'],
+            [NodeEntry(*n) for n in data['nodes']],
+            [ReferenceEntry(*r) for r in data['references']])
+
+
+def build_maya_ascii_index(
+        maya_file_path, index_path=None, write=True, chunk_size=CHUNK_SIZE):
+    """
+    Scan the given Maya ascii file once and record node blocks and references
+    statements byte ranges.
+    :param str maya_file_path:
+    :param str|None index_path: sidecar path, default is next to the scene.
+    :param bool write: save the sidecar file.
+    :rtype: MayaAsciiIndex
+    """
+    size, mtime = _file_signature(maya_file_path)
+    nodes = []
+    references = []
+    current_node = None
+    current_reference = None
+
+    def close_block(end):
+        nonlocal current_node, current_reference
+        if current_node:
+            nodes.append(NodeEntry(*current_node, end))
+        if current_reference:
+            references.append(ReferenceEntry(*current_reference, end))
+        current_node = current_reference = None
+
+    statements = iterate_over_maya_ascii_statements(
+        maya_file_path, chunk_size)
+    for offset, statement in statements:
+        command = statement.split(None, 1)[0]
+        if command in NODE_BLOCK_COMMANDS and current_node:
+            continue
+        close_block(offset)
+        if command == 'createNode':
+            record = parse_maya_ascii_statement(statement, offset)
+            current_node = (
+                record.name, record.node_type, record.parent,
+                _namespace(record.name), offset)
+        elif command == 'select':
+            arguments = statement.split()
+            if '-ne' in arguments or '-noExpand' in arguments:
+                name = arguments[-1].strip('"')
+                current_node = (name, None, None, _namespace(name), offset)
+        elif command == 'file':
+            record = parse_maya_ascii_statement(statement, offset)
+            if '-r' in record.flags or '-reference' in record.flags:
+                current_reference = (
+                    record.path, record.namespace, record.reference_node,
+                    offset)
+    close_block(size)
+
+    index = MayaAsciiIndex(maya_file_path, size, mtime, nodes, references)
+    if write:
+        write_maya_ascii_index(index, index_path)
+    return index
+
+
+def write_maya_ascii_index(index, index_path=None):
+    """
+    Save the sidecar file. Scenes in read only directories (published or
+    locked assets) can't have one: the index then only lives in memory.
+    :return: the sidecar path, None if it can't be written.
+    :rtype: str|None
+    """
+    index_path = index_path or get_index_path(index.maya_file_path)
+    temp_path = f'{index_path}.{os.getpid()}.tmp'
+    try:
+        with gzip.open(temp_path, 'wt', encoding='utf-8') as f:
+            json.dump(index.to_dict(), f, separators=(',', ':'))
+        os.replace(temp_path, index_path)
+    except OSError:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        return None
+    return index_path
+
+
+def load_maya_ascii_index(maya_file_path, index_path=None):
+    """
+    Return the index saved for this file or None if it doesn't exist or if the
+    file changed since it was built.
+    """
+    index_path = index_path or get_index_path(maya_file_path)
+    try:
+        with gzip.open(index_path, 'rt', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get('version') != INDEX_VERSION:
+        return None
+    index = MayaAsciiIndex.from_dict(maya_file_path, data)
+    if not index.is_up_to_date():
+        return None
+    return index
+
+
+def get_maya_ascii_index(maya_file_path, index_path=None):
+    """Load the sidecar index, (re)build it if missing or outdated."""
+    return (
+        load_maya_ascii_index(maya_file_path, index_path) or
+        build_maya_ascii_index(maya_file_path, index_path))
+
+
+def iterate_over_node_records(maya_file_path, node_name, index=None):
+    """
+    Seek directly to the given node block(s) and yield their records
+    (CreateNode, SetAttr, ...).
+    """
+    index = index or get_maya_ascii_index(maya_file_path)
+    for node in index.find_nodes(node_name):
+        records = iterate_over_maya_ascii_records(
+            maya_file_path, start=node.start, end=node.end)
+        for record in records:
+            if isinstance(record, SetAttr) and record.node is None:
+                record = record._replace(node=node.name)
+            yield record
+
+
+def get_node_attribute_values(maya_file_path, node_name, plug, index=None):
+    """
+    Return the values of the last setAttr done on given node plug.
+    Example:
+        get_node_attribute_values(path, 'file1', '.ftn') -> ['/a/b/c.png']
+    :rtype: list[str]|None
+    """
+    if not plug.startswith('.'):
+        plug = '.' + plug
+    values = None
+    for record in iterate_over_node_records(maya_file_path, node_name, index):
+        if isinstance(record, SetAttr) and record.plug == plug:
+            values = record.values
+    return values
+
+
+def get_reference_records(maya_file_path, index=None):
+    """Seek to each "file -r" statement and return their records."""
+    index = index or get_maya_ascii_index(maya_file_path)
+    records = []
+    for reference in index.references:
+        for record in iterate_over_maya_ascii_records(
+                maya_file_path, start=reference.start, end=reference.end):
+            if isinstance(record, FileReference):
+                records.append(record)
+    return records
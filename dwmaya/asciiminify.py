@@ -0,0 +1,255 @@
+"""
+Offline Maya ascii minifier. Doesn't need Maya.
+
+Remove statements which don't change the scene once loaded but which Maya
+still has to parse on every open:
+    - default_values: setAttr setting an attribute to its default value.
+    - duplicates: setAttr overridden later by another one on the same plug.
+    - unknown_nodes: unknown nodes without any connection or child, and the
+      requires of their plugins when no node of that plugin remains.
+    - display_layers: display layers containing no object.
+    - metadata: applyMetadata of nodes which don't exist in the scene.
+The file is read twice (analysis then rewrite), whatever its size.
+Example:
+    report = minify_maya_ascii_file(
+        'lighting.ma', 'lighting_min.ma', unknown_plugins=['Turtle'])
+    report['saved']  # {'duplicates': 1203, 'unknown_nodes': 823021, ...}
+"""
+
+__author__ = 'Olivier Evers'
+__copyright__ = 'DreamWall'
+__license__ = 'MIT'
+
+
+import os
+from collections import Counter
+
+from dwmaya.ascii import (
+    CHUNK_SIZE, iterate_over_maya_ascii_statements,
+    parse_maya_ascii_statement, rewrite_maya_ascii_file,
+    split_maya_ascii_arguments)
+from dwmaya.asciiindex import NODE_BLOCK_COMMANDS
+
+
+MINIFY_CATEGORIES = (
+    'default_values', 'duplicates', 'unknown_nodes', 'display_layers',
+    'metadata')
+UNKNOWN_NODE_TYPES = ('unknown', 'unknownDag', 'unknownTransform')
+# Only attributes which are safe to skip: Maya doesn't save default values,
+# those usually come from scripts or exporters setting everything.
+_TRANSFORM_DEFAULT_VALUES = {
+    '.t': ('0', '0', '0'),
+    '.r': ('0', '0', '0'),
+    '.s': ('1', '1', '1'),
+    '.sh': ('0', '0', '0'),
+    '.ro': ('0',),
+    '.v': ('1',),
+}
+DEFAULT_ATTRIBUTE_VALUES = {
+    'transform': _TRANSFORM_DEFAULT_VALUES,
+    'joint': _TRANSFORM_DEFAULT_VALUES,
+}
+# setAttr with other flags (-k, -l, -s, -cb...) change more than the value.
+_VALUE_ONLY_FLAGS = {'-type', '-typ'}
+_CONNECTION_COMMANDS = ('connectAttr', 'relationship', 'parent')
+_BOOLEANS = {'yes': '1', 'on': '1', 'true': '1', 'no': '0', 'off': '0',
+             'false': '0'}
+
+
+def _short_name(plug_or_node):
+    return plug_or_node.split('.')[0].split('|')[-1].lstrip(':')
+
+
+def _normalize_value(value):
+    value = _BOOLEANS.get(value, value)
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def is_default_value(node_type, record, default_values):
+    defaults = default_values.get(node_type, {}).get(record.plug)
+    if defaults is None or len(defaults) != len(record.values):
+        return False
+    return all(
+        _normalize_value(a) == _normalize_value(b)
+        for a, b in zip(record.values, defaults))
+
+
+class _Node(object):
+    def __init__(self, offset, name, node_type):
+        self.offset = offset
+        self.name = name
+        self.node_type = node_type
+        self.statements = [offset]
+        self.connections = []
+        self.has_members = False
+
+
+def analyze_maya_ascii_redundancies(
+        maya_file_path, categories=MINIFY_CATEGORIES,
+        default_values=None, unknown_plugins=None, chunk_size=CHUNK_SIZE):
+    """
+    Find statements to remove without changing the scene content.
+    :param tuple[str] categories: see MINIFY_CATEGORIES.
+    :param dict|None default_values:
+        {node_type: {plug: values}}, default is DEFAULT_ATTRIBUTE_VALUES.
+    :param list[str]|None unknown_plugins:
+        plugins which aren't available anymore, their nodes are considered
+        unknown nodes.
+    :return: category per statement offset.
+    :rtype: dict[int, str]
+    """
+    default_values = default_values or DEFAULT_ATTRIBUTE_VALUES
+    unknown_plugins = set(unknown_plugins or [])
+    unknown_node_types = set(UNKNOWN_NODE_TYPES)
+    removed = {}
+    plugin_requires = {}  # plugin: (offset, node types)
+    node_type_counts = Counter()
+    created_names = set()
+    candidates = {}  # short name: _Node
+    ambiguous = set()
+    metadata = []  # (offset, node name)
+    mentioned = set()
+    has_references = False
+
+    node = None  # Current node block: (node_type, candidate, created)
+    last_set_attrs = {}
+    statements = iterate_over_maya_ascii_statements(
+        maya_file_path, chunk_size)
+    for offset, statement in statements:
+        command = statement.split(None, 1)[0]
+        if node and command in NODE_BLOCK_COMMANDS:
+            node_type, candidate, created = node
+            if candidate:
+                candidate.statements.append(offset)
+            if command != 'setAttr' or not created:
+                continue
+            record = parse_maya_ascii_statement(statement, offset)
+            if set(record.flags) - _VALUE_ONLY_FLAGS:
+                last_set_attrs.pop(record.plug, None)
+                continue
+            if 'duplicates' in categories:
+                previous = last_set_attrs.get(record.plug)
+                if previous is not None:
+                    removed[previous] = 'duplicates'
+                last_set_attrs[record.plug] = offset
+            if ('default_values' in categories and
+                    is_default_value(node_type, record, default_values)):
+                removed[offset] = 'default_values'
+                last_set_attrs.pop(record.plug, None)
+            continue
+
+        node = None
+        last_set_attrs = {}
+        if command == 'createNode':
+            record = parse_maya_ascii_statement(statement, offset)
+            node_type_counts[record.node_type] += 1
+            created_names.add(record.name)
+            if record.parent:
+                mentioned.add(_short_name(record.parent))
+            candidate = None
+            is_candidate = record.node_type in unknown_node_types or (
+                record.node_type == 'displayLayer' and not record.shared)
+            if is_candidate and record.name in candidates:
+                ambiguous.add(record.name)
+            elif is_candidate:
+                candidate = _Node(offset, record.name, record.node_type)
+                candidates[record.name] = candidate
+            node = record.node_type, candidate, True
+        elif command == 'select':
+            arguments = statement.split()
+            if '-ne' in arguments or '-noExpand' in arguments:
+                node = None, None, False
+        elif command == 'requires':
+            record = parse_maya_ascii_statement(statement, offset)
+            if record.plugin in unknown_plugins:
+                unknown_node_types.update(record.node_types)
+                plugin_requires[record.plugin] = offset, record.node_types
+        elif command in _CONNECTION_COMMANDS:
+            arguments = split_maya_ascii_arguments(statement.split(None, 1)[1])
+            plugs = [a for a, quoted in arguments if quoted]
+            names = [_short_name(plug) for plug in plugs]
+            mentioned.update(names)
+            if command != 'connectAttr' or len(names) < 2:
+                continue
+            for name in names[:2]:
+                if name in candidates:
+                    candidates[name].connections.append(offset)
+            layer = candidates.get(names[0])
+            if layer and plugs[0].endswith(('.di', '.drawInfo')):
+                layer.has_members = True
+        elif command == 'file':
+            has_references = True
+        elif command == 'applyMetadata':
+            arguments = split_maya_ascii_arguments(statement.split(None, 1)[1])
+            metadata.append((offset, _short_name(arguments[-1][0])))
+
+    removed_names = set()
+    for name, candidate in candidates.items():
+        if name in ambiguous or name == 'defaultLayer':
+            continue
+        if candidate.node_type == 'displayLayer':
+            if 'display_layers' not in categories or candidate.has_members:
+                continue
+            category = 'display_layers'
+            statements = candidate.statements + candidate.connections
+        else:
+            if 'unknown_nodes' not in categories or name in mentioned:
+                continue
+            category = 'unknown_nodes'
+            statements = candidate.statements
+        removed_names.add(name)
+        node_type_counts[candidate.node_type] -= 1
+        for offset in statements:
+            removed[offset] = category
+
+    if 'unknown_nodes' in categories:
+        for offset, node_types in plugin_requires.values():
+            if not any(node_type_counts[t] > 0 for t in node_types):
+                removed[offset] = 'unknown_nodes'
+
+    if 'metadata' in categories:
+        for offset, name in metadata:
+            # Referenced nodes aren't created in the scene itself.
+            missing = name not in created_names and not has_references
+            if name in removed_names or missing:
+                removed[offset] = 'metadata'
+    return removed
+
+
+def minify_maya_ascii_file(
+        maya_file_path, output_path, categories=MINIFY_CATEGORIES,
+        default_values=None, unknown_plugins=None, chunk_size=CHUNK_SIZE):
+    """
+    Write a smaller equivalent copy of a Maya ascii scene.
+    See analyze_maya_ascii_redundancies for arguments.
+    :return:
+        dict(
+            input_size=int,
+            output_size=int,
+            removed={category: statements count},
+            saved={category: bytes})
+    :rtype: dict
+    """
+    removed = analyze_maya_ascii_redundancies(
+        maya_file_path, categories, default_values, unknown_plugins,
+        chunk_size)
+    counts = Counter()
+    saved = Counter()
+
+    def minify(offset, statement):
+        category = removed.get(offset)
+        if category is None:
+            return statement
+        counts[category] += 1
+        saved[category] += len(statement) + 1  # ";"
+        return None
+
+    rewrite_maya_ascii_file(maya_file_path, output_path, minify, chunk_size)
+    return dict(
+        input_size=os.path.getsize(maya_file_path),
+        output_size=os.path.getsize(output_path),
+        removed=dict(counts),
+        saved=dict(saved))
@@ -0,0 +1,186 @@
+"""
+Bulk world space bake of constrained, parented or driven transforms.
+
+World matrices of all the nodes are sampled in a single pass through a DG
+context (the current time doesn't change), decomposed with NumPy and
+written as plain keys with one addKeys per curve. This replaces
+mc.bakeResults for big node counts.
+"""
+
+__author__ = 'Olivier Evers'
+__copyright__ = 'DreamWall'
+__license__ = 'MIT'
+
+
+import numpy as np
+import maya.cmds as mc
+import maya.api.OpenMaya as om2
+import maya.api.OpenMayaAnim as oma2
+
+from dwmaya.animation import OPEN_MAYA_TANGENT_TYPES
+from dwmaya.euler import (
+    ROTATE_ORDERS, apply_euler_continuity, euler_to_matrices,
+    matrices_to_euler)
+from dwmaya.sampling import sample_plugs
+
+
+TRANSFORM_CURVE_TYPES = {
+    'translate': oma2.MFnAnimCurve.kAnimCurveTL,
+    'rotate': oma2.MFnAnimCurve.kAnimCurveTA,
+    'scale': oma2.MFnAnimCurve.kAnimCurveTU,
+}
+# Sampled on each node, in this order.
+_SAMPLED_ATTRIBUTES = (
+    'worldMatrix', 'parentInverseMatrix', 'rotatePivot',
+    'rotatePivotTranslate', 'scalePivot', 'scalePivotTranslate',
+    'rotateAxis')
+_EPSILON = 1e-9
+
+
+def _rotate_orders(nodes):
+    return np.array([mc.getAttr(f'{node}.rotateOrder') for node in nodes])
+
+
+def compute_local_transforms(nodes, frames):
+    """
+    Sample nodes world matrices and return the translate, rotate and scale
+    values (internal units) giving the same world matrices.
+    Pivots, rotate axis and joint orient are taken in account, shear and
+    segment scale compensate are not.
+    :return: translates, rotates and scales arrays of shape (frames, nodes, 3)
+    :rtype: tuple[np.ndarray, np.ndarray, np.ndarray]
+    """
+    frames = list(frames)
+    plugs = [
+        f'{node}.{attribute}' for node in nodes
+        for attribute in _SAMPLED_ATTRIBUTES]
+    samples = sample_plugs(plugs, frames)
+    samples = samples.reshape(
+        len(frames), len(nodes), len(_SAMPLED_ATTRIBUTES), -1)
+    world = samples[:, :, 0, :16].reshape(len(frames), len(nodes), 4, 4)
+    parent_inverse = samples[:, :, 1, :16].reshape(world.shape)
+    rotate_pivot, rotate_pivot_translate, scale_pivot, \
+        scale_pivot_translate, rotate_axis = (
+            samples[:, :, i, :3] for i in range(2, 7))
+    joint_orient = np.zeros((len(nodes), 3))
+    joints = [i for i, n in enumerate(nodes) if mc.nodeType(n) == 'joint']
+    if joints:
+        plugs = [f'{nodes[i]}.jointOrient' for i in joints]
+        joint_orient[joints] = sample_plugs(plugs, frames[:1])[0]
+
+    local = world @ parent_inverse
+    matrices = local[..., :3, :3]
+    scales = np.linalg.norm(matrices, axis=-1)
+    mirrored = np.linalg.det(matrices) < 0
+    scales[..., 0] = np.where(mirrored, -scales[..., 0], scales[..., 0])
+    rotations = matrices / np.where(
+        np.abs(scales) < _EPSILON, 1, scales)[..., None]
+
+    # Matrix = Sp^-1 * S * Sp * St * Rp^-1 * Ra * R * Jo * Rp * Rt * T
+    pivot_offsets = (
+        -scale_pivot * scales + scale_pivot + scale_pivot_translate -
+        rotate_pivot)
+    pivot_offsets = np.einsum('...i,...ij->...j', pivot_offsets, rotations)
+    translates = (
+        local[..., 3, :3] - pivot_offsets - rotate_pivot -
+        rotate_pivot_translate)
+
+    rotations = (
+        np.swapaxes(euler_to_matrices(rotate_axis), -1, -2) @ rotations @
+        np.swapaxes(euler_to_matrices(joint_orient), -1, -2))
+    rotates = np.empty(translates.shape)
+    rotate_orders = _rotate_orders(nodes)
+    for index, rotate_order in enumerate(ROTATE_ORDERS):
+        mask = rotate_orders == index
+        if not mask.any():
+            continue
+        euler = matrices_to_euler(rotations[:, mask], rotate_order)
+        rotates[:, mask] = apply_euler_continuity(euler, rotate_order)
+    return translates, rotates, scales
+
+
+def _list_constraints(nodes):
+    return sorted(set(mc.listConnections(
+        nodes, source=True, destination=False, type='constraint') or []))
+
+
+def _get_anim_curves(plugs, curve_type):
+    """
+    Return anim curves driving plugs. Other inputs (constraints, pair
+    blends...) are disconnected and replaced by new curves.
+    """
+    modifier = om2.MDGModifier()
+    curves = []
+    for plug in plugs:
+        source = plug.source()
+        if source.isNull:
+            curves.append(None)
+            continue
+        source_node = source.node()
+        if source_node.hasFn(om2.MFn.kAnimCurve):
+            curves.append(oma2.MFnAnimCurve(source_node))
+            continue
+        modifier.disconnect(source, plug)
+        curves.append(None)
+    modifier.doIt()
+    for i, (plug, curve) in enumerate(zip(plugs, curves)):
+        if curve is None:
+            curve = oma2.MFnAnimCurve()
+            curve.create(plug, curve_type)
+            curves[i] = curve
+    return curves
+
+
+def bake_world_space(
+        nodes, frames, delete_constraints=True, tangent_type='linear'):
+    """
+    Bake transforms animation to keep their current world space motion.
+    All nodes are sampled before anything is modified, so parents and
+    children can be baked together.
+    :param list[str] nodes: transforms or joints.
+    :param list[float] frames:
+    :param bool delete_constraints: delete the constraints driving the nodes.
+    :param str tangent_type: see dwmaya.animation.OPEN_MAYA_TANGENT_TYPES.
+    :return: baked nodes.
+    :rtype: list[str]
+    """
+    nodes = mc.ls(nodes, long=True, type='transform')
+    frames = list(frames)
+    if not nodes or not frames:
+        return []
+    translates, rotates, scales = compute_local_transforms(nodes, frames)
+    constraints = _list_constraints(nodes) if delete_constraints else []
+
+    time_unit = om2.MTime.uiUnit()
+    time_array = om2.MTimeArray(len(frames), om2.MTime())
+    for i, frame in enumerate(frames):
+        time_array[i] = om2.MTime(frame, time_unit)
+    tangent_type = OPEN_MAYA_TANGENT_TYPES[tangent_type]
+
+    selection = om2.MSelectionList()
+    for node in nodes:
+        selection.add(node)
+    for attribute, values in (
+            ('translate', translates), ('rotate', rotates),
+            ('scale', scales)):
+        curve_type = TRANSFORM_CURVE_TYPES[attribute]
+        plugs = []
+        plug_values = []
+        for i in range(len(nodes)):
+            node = om2.MFnDependencyNode(selection.getDependNode(i))
+            compound = node.findPlug(attribute, False)
+            for axis in range(3):
+                plug = compound.child(axis)
+                if plug.isLocked:
+                    continue
+                plugs.append(plug)
+                plug_values.append(values[:, i, axis])
+        curves = _get_anim_curves(plugs, curve_type)
+        for curve, curve_values in zip(curves, plug_values):
+            curve.addKeys(
+                time_array, om2.MDoubleArray(curve_values.tolist()),
+                tangent_type, tangent_type, False)
+
+    if constraints:
+        mc.delete(constraints)
+    return nodes
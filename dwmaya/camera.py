@@ -5,12 +5,15 @@ __license__ = 'MIT'
 
 from contextlib import contextmanager
 
+import numpy as np
 import maya.OpenMaya as om
 import maya.OpenMayaUI as omui
 import maya.cmds as mc
 
 from dwmaya.attributes import get_attr, set_attr, unlock_attr
+from dwmaya.euler import apply_euler_continuity, matrices_to_euler
 from dwmaya.hierarchy import get_shape_and_transform
+from dwmaya.sampling import sample_plugs, sample_world_matrices
 
 
 def find_active_camera():
@@ -51,6 +54,26 @@ def transfer_camera_framing(source_cam, target_cam, fov=True):
             set_attr(target_cam, attr, value)
 
 
+def _decompose_world_matrices(matrices):
+    """
+    Translate, rotate and scale values (ui units) of an unparented transform
+    with default pivots and rotate order for the given world matrices.
+    :param np.ndarray matrices: array of shape (frames, 16).
+    :rtype: tuple[np.ndarray, np.ndarray, np.ndarray]
+    """
+    matrices = np.asarray(matrices, dtype=np.float64).reshape(-1, 4, 4)
+    rotations = matrices[:, :3, :3]
+    scales = np.linalg.norm(rotations, axis=-1)
+    mirrored = np.linalg.det(rotations) < 0
+    scales[:, 0] = np.where(mirrored, -scales[:, 0], scales[:, 0])
+    rotations = rotations / np.where(scales == 0, 1, scales)[..., None]
+    rotates = apply_euler_continuity(matrices_to_euler(rotations))
+    # World matrices are in internal units (centimeters, radians).
+    translates = matrices[:, 3, :3] * om.MDistance.internalToUI(1.0)
+    rotates = rotates * om.MAngle.internalToUI(1.0)
+    return translates, rotates, scales
+
+
 def bake_multiple_camera_to_single_one(
         cameras=None, camera_name=None, adapt_framerange=True):
     cameras = cameras or mc.ls(selection=True, dag=True, type='camera')
@@ -62,7 +85,8 @@ def bake_multiple_camera_to_single_one(
     )
 
     # Copy animation
-    animation_data = []
+    matrices = []
+    framing_values = []
     all_frames = []
     count = len(cameras)
     mc.progressWindow(title='Concatenating cameras')
@@ -81,32 +105,39 @@ def bake_multiple_camera_to_single_one(
             all_frames.extend(frames)
             start, end = int(min(frames)), int(max(frames))
             # Parse and save
-            for frame in range(start, end + 1):
-                frame_data = dict()
-                animation_data.append(frame_data)
-                mc.currentTime(frame)
-                frame_data['matrix'] = mc.xform(
-                    xform, query=True, matrix=True, worldSpace=True)
-                for attr in framing_attributes:
-                    frame_data[attr] = mc.getAttr(f'{camera}.{attr}')
+            frames = range(start, end + 1)
+            matrices.append(sample_world_matrices([xform], frames)[:, 0])
+            plugs = [f'{camera}.{attr}' for attr in framing_attributes]
+            framing_values.append(
+                sample_plugs(plugs, frames, ui_units=True)[:, :, 0])
     finally:
         mc.progressWindow(endProgress=True)
 
     # Create camera and paste animation
     xform, camera = mc.camera(name=camera_name or 'baked_cameras')
-    current_frame = first_frame = min(all_frames)
-    for data in animation_data:
-        # Change and increment frame
-        mc.currentTime(current_frame)
-        current_frame += 1
-        # Set attributes
-        mc.xform(xform, matrix=data.pop('matrix'))
-        mc.setKeyframe(xform)
-        for attr, value in data.items():
-            mc.setKeyframe(f'{camera}.{attr}', value=value)
+    if not matrices:
+        return
+    first_frame = min(all_frames)
+    translates, rotates, scales = _decompose_world_matrices(
+        np.concatenate(matrices))
+    framing_values = np.concatenate(framing_values)
+    frames = first_frame + np.arange(len(framing_values))
+    channels = [
+        (f'{xform}.{attribute}{axis}', values[:, i])
+        for attribute, values in (
+            ('translate', translates), ('rotate', rotates),
+            ('scale', scales))
+        for i, axis in enumerate('XYZ')]
+    channels.extend(
+        (f'{camera}.{attr}', framing_values[:, i])
+        for i, attr in enumerate(framing_attributes))
+    for plug, values in channels:
+        for frame, value in zip(frames.tolist(), values.tolist()):
+            mc.setKeyframe(plug, time=frame, value=value)
 
     if adapt_framerange:
-        mc.playbackOptions(min=int(first_frame), max=int(current_frame))
+        mc.playbackOptions(
+            min=int(first_frame), max=int(first_frame + len(frames)))
 
 
 def set_single_camera_renderable(cam):
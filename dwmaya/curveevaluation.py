@@ -0,0 +1,309 @@
+"""
+Vectorized animation curves evaluation with NumPy. Doesn't need Maya.
+
+Curves (dwmaya.asciianimation.AnimCurveArrays) are packed in flat arrays
+and all the curves are evaluated on all the frames at once:
+    curves = extract_anim_curves('sh010_anim.ma')
+    values = evaluate_anim_curves(curves.values(), range(101, 201))
+    values.shape  # (curves count, frames count)
+
+Segments are cubic Bezier curves like in Maya. Non weighted tangents only
+define a slope, the handles are a third of the segment long (Hermite).
+Weighted tangents define the handles. Stored tangents (x in seconds, y in
+internal units, as MFnAnimCurve.getTangent) are used as is. Tangents which
+aren't stored are computed from their tangent type, those are close to
+Maya's algorithms but not bit exact for auto, plateau and clamped.
+"""
+
+__author__ = 'Olivier Evers'
+__copyright__ = 'DreamWall'
+__license__ = 'MIT'
+
+
+import math
+from collections import namedtuple
+
+import numpy as np
+
+from dwmaya.asciianimation import INFINITY_TYPES, TANGENT_TYPES
+
+
+_TANGENT_CODES = {name: code for code, name in TANGENT_TYPES.items()}
+_INFINITY_CODES = {name: code for code, name in INFINITY_TYPES.items()}
+CONSTANT, LINEAR, CYCLE, CYCLE_RELATIVE, OSCILLATE = (
+    _INFINITY_CODES[name] for name in (
+        'constant', 'linear', 'cycle', 'cycleRelative', 'oscillate'))
+STEP = _TANGENT_CODES['step']
+STEP_NEXT = _TANGENT_CODES['stepnext']
+# Curves whose tangents y are stored in radians.
+ANGULAR_CURVE_TYPES = ('animCurveTA', 'animCurveUA')
+_BISECTION_ITERATIONS = 40
+_EPSILON = 1e-9
+
+
+PackedAnimCurves = namedtuple(
+    'PackedAnimCurves',
+    'names starts ends times values in_x in_y out_x out_y in_types '
+    'out_types weighted pre_infinity post_infinity')
+
+
+def compute_tangent_slopes(times, values, tangent_types, in_tangent=True):
+    """
+    Compute slopes (value per frame) of the tangents of a single curve from
+    their types.
+    """
+    count = len(times)
+    slopes = np.zeros(count)
+    if count < 2:
+        return slopes
+    segment_slopes = np.diff(values) / np.maximum(np.diff(times), _EPSILON)
+    previous = np.concatenate(([segment_slopes[0]], segment_slopes))
+    following = np.concatenate((segment_slopes, [segment_slopes[-1]]))
+    smooth = np.empty(count)
+    smooth[1:-1] = (values[2:] - values[:-2]) / np.maximum(
+        times[2:] - times[:-2], _EPSILON)
+    smooth[0], smooth[-1] = following[0], previous[-1]
+
+    # Flat at extremes and curve ends, no overshoot elsewhere.
+    extreme = previous * following <= 0
+    extreme[0] = extreme[-1] = True
+    limit = 3 * np.minimum(np.abs(previous), np.abs(following))
+    no_overshoot = np.clip(smooth, -limit, limit)
+    no_overshoot[extreme] = 0
+    # Flat when a neighbour has the same value.
+    clamped = smooth.copy()
+    clamped[(previous == 0) | (following == 0)] = 0
+
+    codes = _TANGENT_CODES
+    slopes[:] = smooth  # fixed, global, smooth, slow and fast.
+    linear = tangent_types == codes['linear']
+    slopes[linear] = (previous if in_tangent else following)[linear]
+    slopes[tangent_types == codes['clamped']] = \
+        clamped[tangent_types == codes['clamped']]
+    for name in ('auto', 'plateau'):
+        mask = tangent_types == codes[name]
+        slopes[mask] = no_overshoot[mask]
+    for name in ('flat', 'step', 'stepnext'):
+        slopes[tangent_types == codes[name]] = 0
+    return slopes
+
+
+def _curve_tangents(curve, frame_rate):
+    """
+    Return in and out tangents (x in frames, y in values) of a curve, with
+    computed tangents where they are not stored.
+    """
+    y_scale = 1.0
+    if curve.node_type in ANGULAR_CURVE_TYPES:
+        y_scale = math.degrees(1)
+    tangents = []
+    for x, y, types, is_in in (
+            (curve.in_x, curve.in_y, curve.in_tangent_types, True),
+            (curve.out_x, curve.out_y, curve.out_tangent_types, False)):
+        x = np.asarray(x, dtype=np.float64) * frame_rate
+        y = np.asarray(y, dtype=np.float64) * y_scale
+        computed = np.isnan(x) | np.isnan(y) | (np.abs(x) < _EPSILON)
+        if computed.any():
+            slopes = compute_tangent_slopes(
+                curve.times, curve.values, types, in_tangent=is_in)
+            x = np.where(computed, 1.0, x)
+            y = np.where(computed, slopes, y)
+            if curve.weighted:
+                # Default weight: a third of the adjacent segment.
+                segments = np.diff(curve.times)
+                lengths = np.concatenate(
+                    ([segments[0]], segments) if is_in else
+                    (segments, [segments[-1]])) if len(segments) else x
+                x = np.where(computed, lengths, x)
+                y = np.where(computed, slopes * lengths, y)
+        tangents.extend((x, y))
+    return tangents
+
+
+def pack_anim_curves(curves, frame_rate=24.0):
+    """
+    Concatenate curves keys in flat arrays, compute missing tangents.
+    :param list[AnimCurveArrays] curves:
+    :param float frame_rate: frames per second of the keys times.
+    :rtype: PackedAnimCurves
+    """
+    curves = list(curves)
+    counts = np.array([len(c.times) for c in curves], dtype=np.int64)
+    ends = np.cumsum(counts)
+    starts = ends - counts
+    arrays = {key: [] for key in (
+        'times', 'values', 'in_x', 'in_y', 'out_x', 'out_y', 'in_types',
+        'out_types')}
+    for curve in curves:
+        tangents = _curve_tangents(curve, frame_rate)
+        for key, array in zip(('in_x', 'in_y', 'out_x', 'out_y'), tangents):
+            arrays[key].append(array)
+        arrays['times'].append(np.asarray(curve.times, dtype=np.float64))
+        arrays['values'].append(np.asarray(curve.values, dtype=np.float64))
+        arrays['in_types'].append(curve.in_tangent_types)
+        arrays['out_types'].append(curve.out_tangent_types)
+    empty = np.zeros(0)
+    arrays = {
+        key: np.concatenate(value) if value else empty
+        for key, value in arrays.items()}
+    return PackedAnimCurves(
+        names=[c.name for c in curves],
+        starts=starts,
+        ends=ends,
+        weighted=np.array([c.weighted for c in curves], dtype=bool),
+        pre_infinity=np.array(
+            [_INFINITY_CODES[c.pre_infinity] for c in curves], np.int8),
+        post_infinity=np.array(
+            [_INFINITY_CODES[c.post_infinity] for c in curves], np.int8),
+        **arrays)
+
+
+def _map_infinity(times, first, span, infinity, before):
+    """
+    Bring times outside of the keys range back in it for cycling infinities.
+    Return the mapped times and the cycles count (for cycle relative).
+    """
+    span = np.maximum(span, _EPSILON)
+    relative = times - first
+    cycles = np.floor(relative / span)
+    cycle = np.isin(infinity, (CYCLE, CYCLE_RELATIVE)) & before
+    oscillate = (infinity == OSCILLATE) & before
+    mapped = np.where(cycle, first + relative - cycles * span, times)
+    phase = np.mod(relative, 2 * span)
+    mapped = np.where(
+        oscillate,
+        first + np.where(phase <= span, phase, 2 * span - phase),
+        mapped)
+    cycles = np.where((infinity == CYCLE_RELATIVE) & before, cycles, 0)
+    return mapped, cycles
+
+
+def _solve_bezier_parameter(times, x0, x1, x2, x3):
+    """Find s in [0, 1] where the (monotonic) Bezier x(s) equals times."""
+    low = np.zeros_like(times)
+    high = np.ones_like(times)
+    for _ in range(_BISECTION_ITERATIONS):
+        s = (low + high) * 0.5
+        r = 1 - s
+        x = r * r * r * x0 + 3 * r * r * s * x1 + 3 * r * s * s * x2 + \
+            s * s * s * x3
+        below = x < times
+        low = np.where(below, s, low)
+        high = np.where(below, high, s)
+    return (low + high) * 0.5
+
+
+def evaluate_anim_curves(curves, frames, frame_rate=24.0):
+    """
+    Evaluate many curves on many frames in one vectorized pass.
+    :param list[AnimCurveArrays]|PackedAnimCurves curves:
+    :param list[float]|np.ndarray frames:
+    :param float frame_rate: frames per second of the keys times.
+    :return: values array of shape (curves count, frames count). Curves
+        without keys are NaN.
+    :rtype: np.ndarray
+    """
+    packed = curves
+    if not isinstance(packed, PackedAnimCurves):
+        packed = pack_anim_curves(curves, frame_rate)
+    frames = np.asarray(frames, dtype=np.float64)
+    curves_count = len(packed.starts)
+    result = np.full((curves_count, len(frames)), np.nan)
+    valid = packed.ends > packed.starts
+    if not valid.any():
+        return result
+
+    starts = packed.starts[valid][:, None]
+    lasts = packed.ends[valid][:, None] - 1
+    first_times = packed.times[starts]
+    last_times = packed.times[lasts]
+    spans = last_times - first_times
+    pre = packed.pre_infinity[valid][:, None]
+    post = packed.post_infinity[valid][:, None]
+    times = np.broadcast_to(frames, (len(starts), len(frames)))
+
+    # Infinity
+    before = times < first_times
+    after = times > last_times
+    times, pre_cycles = _map_infinity(
+        times, first_times, spans, pre, before)
+    times, post_cycles = _map_infinity(
+        times, first_times, spans, post, after)
+    cycles = pre_cycles + post_cycles
+    times = np.clip(times, first_times, last_times)
+
+    # Find segments. Curves keys are searched all at once by offsetting
+    # each curve times so they follow each other.
+    offsets = np.cumsum(np.concatenate(([0.0], (spans[:, 0] + 1)[:-1])))
+    offsets = offsets - first_times[:, 0]
+    curve_ids = np.repeat(
+        np.arange(len(starts)), (lasts - starts + 1)[:, 0])
+    # Curves without keys have no times, packed times are the valid ones.
+    shifted_keys = packed.times + offsets[curve_ids]
+    shifted_times = times + offsets[:, None]
+    first_indices = np.concatenate(([0], np.cumsum(lasts - starts + 1)))
+    key_index = np.searchsorted(shifted_keys, shifted_times, side='right')
+    key_index -= 1
+    local = key_index - first_indices[:-1, None]
+    local = np.clip(local, 0, np.maximum(lasts - starts - 1, 0))
+    i0 = starts + local
+    i1 = np.minimum(i0 + 1, lasts)
+
+    t0, t1 = packed.times[i0], packed.times[i1]
+    v0, v1 = packed.values[i0], packed.values[i1]
+    dt = t1 - t0
+    single = dt <= 0
+    dt = np.where(single, 1.0, dt)
+    ox, oy = packed.out_x[i0], packed.out_y[i0]
+    ix, iy = packed.in_x[i1], packed.in_y[i1]
+    weighted = np.broadcast_to(packed.weighted[valid][:, None], times.shape)
+
+    # Control points. Non weighted handles are a third of the segment.
+    third = dt / 3
+    x1 = np.where(weighted, t0 + np.minimum(np.abs(ox) / 3, dt), t0 + third)
+    x2 = np.where(weighted, t1 - np.minimum(np.abs(ix) / 3, dt), t1 - third)
+    y1 = np.where(
+        weighted, v0 + oy / 3, v0 + oy / np.where(ox == 0, 1, ox) * third)
+    y2 = np.where(
+        weighted, v1 - iy / 3, v1 - iy / np.where(ix == 0, 1, ix) * third)
+
+    s = (times - t0) / dt
+    if weighted.any():
+        s = np.where(
+            weighted,
+            _solve_bezier_parameter(times, t0, x1, x2, t1), s)
+    s = np.clip(s, 0, 1)
+    r = 1 - s
+    values = r * r * r * v0 + 3 * r * r * s * y1 + 3 * r * s * s * y2 + \
+        s * s * s * v1
+
+    out_types = packed.out_types[i0]
+    values = np.where(out_types == STEP, v0, values)
+    values = np.where((out_types == STEP_NEXT) & (times > t0), v1, values)
+    values = np.where(single, v0, values)
+    values = np.where(times >= t1, np.where(single, v0, v1), values)
+
+    # Cycle relative offsets and linear extrapolation.
+    first_values = packed.values[starts]
+    last_values = packed.values[lasts]
+    values = values + cycles * (last_values - first_values)
+    frames = np.broadcast_to(frames, times.shape)
+    in_slopes = _slope(packed.in_x[starts], packed.in_y[starts])
+    out_slopes = _slope(packed.out_x[lasts], packed.out_y[lasts])
+    values = np.where(
+        before & (pre == LINEAR),
+        first_values + in_slopes * (frames - first_times), values)
+    values = np.where(
+        after & (post == LINEAR),
+        last_values + out_slopes * (frames - last_times), values)
+    result[valid] = values
+    return result
+
+
+def _slope(x, y):
+    return np.where(np.abs(x) < _EPSILON, 0, y / np.where(x == 0, 1, x))
+
+
+def evaluate_anim_curve(curve, frames, frame_rate=24.0):
+    """Evaluate a single AnimCurveArrays, return a 1D array."""
+    return evaluate_anim_curves([curve], frames, frame_rate)[0]
@@ -1,6 +1,7 @@
 import maya.cmds as mc
 import maya.api.OpenMaya as om2
 from dwmaya.deformer.tag import force_deformation_component_tags_var
+from dwmaya.sampling import sample_mesh_points
 
 
 MOTION_SMOOTH_CACHE_BLENDSHAPE_NAME = '{}_motion_smooth_cache_BS'
@@ -50,22 +51,12 @@ def create_motionblend_mesh(base, aperture=1, samples=1, skip_center=False):
     selection_list.add(motion_blend)
 
     current_time = mc.currentTime(query=True)
-    base_fn_mesh = om2.MFnMesh(selection_list.getDagPath(0))
-    points = []
-    for frame in get_frame_samples(aperture, samples):
-        if skip_center is True and frame == current_time:
-            continue
-        mc.currentTime(frame, edit=True)
-        points.append(base_fn_mesh.getPoints())
-    mc.currentTime(current_time, edit=True)
-
-    motion_blend_points = []
-    for i in range(len(points[0])):
-        x = sum(p[i][0] for p in points) / len(points)
-        y = sum(p[i][1] for p in points) / len(points)
-        z = sum(p[i][2] for p in points) / len(points)
-        position = om2.MPoint(x, y, z)
-        motion_blend_points.append(position)
+    frames = [
+        frame for frame in get_frame_samples(aperture, samples)
+        if not (skip_center is True and frame == current_time)]
+    points = sample_mesh_points(base, frames)
+    motion_blend_points = [
+        om2.MPoint(*position) for position in points.mean(axis=0)]
     motion_blend_fn_mesh = om2.MFnMesh(selection_list.getDagPath(1))
     motion_blend_fn_mesh.setPoints(motion_blend_points)
     motion_blend_fn_mesh.updateSurface()
@@ -0,0 +1,187 @@
+"""
+Offline scene dependencies scanner. Doesn't need Maya.
+
+Example:
+    graph = scan_scenes_dependencies(glob.glob('/prod/ep01/*/*.ma'))
+    graph['/prod/ep01/sh010/sh010_anim.ma']['references']
+"""
+
+__author__ = 'Olivier Evers'
+__copyright__ = 'DreamWall'
+__license__ = 'MIT'
+
+
+import os
+import re
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from dwmaya.ascii import (
+    iterate_over_maya_ascii_statements, parse_maya_ascii_statement)
+from dwmaya.mayabinary import read_maya_binary_file_info
+
+
+TEXTURE_EXTENSIONS = (
+    '.png', '.jpg', '.jpeg', '.tif', '.tiff', '.tga', '.exr', '.hdr', '.tx',
+    '.tex', '.bmp', '.psd', '.iff', '.dds', '.gif')
+CACHE_EXTENSIONS = (
+    '.abc', '.usd', '.usda', '.usdc', '.usdz', '.vdb', '.fur', '.mcx',
+    '.mcc', '.xml', '.bgeo', '.fbx', '.obj', '.ass', '.rs', '.gpu')
+AUDIO_EXTENSIONS = ('.wav', '.aif', '.aiff', '.mp3', '.ogg')
+SCENE_EXTENSIONS = ('.ma', '.mb')
+DEPENDENCY_CATEGORIES = (
+    'references', 'textures', 'caches', 'audio', 'others')
+
+_COPY_NUMBER = re.compile(r'\{\d+\}$')
+# Extensions have a letter, "1/2.5" isn't a path.
+_EXTENSION = re.compile(r'^\.\w*[a-zA-Z]\w*$')
+
+
+def get_dependency_category(path):
+    extension = os.path.splitext(path)[-1].lower()
+    if extension in TEXTURE_EXTENSIONS:
+        return 'textures'
+    if extension in CACHE_EXTENSIONS:
+        return 'caches'
+    if extension in AUDIO_EXTENSIONS:
+        return 'audio'
+    if extension in SCENE_EXTENSIONS:
+        return 'references'
+    return 'others'
+
+
+def looks_like_path(value):
+    """
+    String values with a file extension and at least one separator, so
+    relative paths (textures/wood.png) are found too.
+    """
+    extension = os.path.splitext(value)[-1]
+    if '\n' in value or not _EXTENSION.match(extension):
+        return False
+    return '/' in value or '\\' in value
+
+
+def get_statement_dependencies(statement, offset=None):
+    """
+    Return (category, path) for each path used by a Maya ascii statement.
+    :rtype: list[tuple[str, str]]
+    """
+    if statement.startswith('file '):
+        record = parse_maya_ascii_statement(statement, offset)
+        if record.path and ('-r' in record.flags or
+                            '-reference' in record.flags):
+            return [('references', _COPY_NUMBER.sub('', record.path))]
+    elif statement.startswith('setAttr ') and '"string"' in statement:
+        record = parse_maya_ascii_statement(statement, offset)
+        return [
+            (get_dependency_category(value), value)
+            for value in record.values if looks_like_path(value)]
+    return []
+
+
+def scan_maya_ascii_dependencies(maya_file_path):
+    """
+    List file paths used by a Maya ascii scene, sorted by category:
+    references, textures, caches, audio and others.
+    Paths are returned as written in the file (unresolved).
+    :rtype: dict[str, list[str]]
+    """
+    dependencies = {category: set() for category in DEPENDENCY_CATEGORIES}
+    for offset, statement in iterate_over_maya_ascii_statements(
+            maya_file_path):
+        for category, path in get_statement_dependencies(statement, offset):
+            dependencies[category].add(path)
+    return {k: sorted(v) for k, v in dependencies.items()}
+
+
+def scan_maya_binary_dependencies(maya_file_path):
+    """Same as scan_maya_ascii_dependencies for Maya binary files."""
+    info = read_maya_binary_file_info(maya_file_path)
+    dependencies = {category: set() for category in DEPENDENCY_CATEGORIES}
+    dependencies['references'].update(info['references'])
+    for path in info['paths']:
+        if os.path.splitext(path)[-1]:
+            dependencies[get_dependency_category(path)].add(path)
+    return {k: sorted(v) for k, v in dependencies.items()}
+
+
+def scan_scene_dependencies(maya_file_path):
+    if maya_file_path.lower().endswith('.mb'):
+        return scan_maya_binary_dependencies(maya_file_path)
+    return scan_maya_ascii_dependencies(maya_file_path)
+
+
+def resolve_dependency_path(path, scene_path=None):
+    path = os.path.expandvars(path)
+    if scene_path and not os.path.isabs(path):
+        path = os.path.join(os.path.dirname(scene_path), path)
+    return os.path.normpath(path).replace('\\', '/')
+
+
+def _scan(maya_file_path):
+    try:
+        return maya_file_path, scan_scene_dependencies(maya_file_path)
+    except (OSError, ValueError) as e:
+        return maya_file_path, {'error': str(e)}
+
+
+def scan_scenes_dependencies(
+        maya_file_paths, recursive=True, max_workers=None):
+    """
+    Scan many Maya scenes in parallel processes and return a dependency
+    graph: {scene_path: {category: [paths]}}.
+    If recursive, referenced scenes are scanned as well (once each, even if
+    referenced by many scenes).
+    :param list[str] maya_file_paths:
+    :param bool recursive: follow references.
+    :param int|None max_workers: processes count (default: cpu count).
+    :rtype: dict[str, dict[str, list[str]]]
+    """
+    graph = {}
+    submitted = set()
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = set()
+        for path in maya_file_paths:
+            path = resolve_dependency_path(path)
+            if path not in submitted:
+                submitted.add(path)
+                futures.add(executor.submit(_scan, path))
+        while futures:
+            done, futures = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                scene_path, dependencies = future.result()
+                graph[scene_path] = dependencies
+                if not recursive:
+                    continue
+                for reference in dependencies.get('references', []):
+                    reference = resolve_dependency_path(reference, scene_path)
+                    if reference in submitted:
+                        continue
+                    if not reference.lower().endswith(SCENE_EXTENSIONS):
+                        continue
+                    if not os.path.isfile(reference):
+                        continue
+                    submitted.add(reference)
+                    futures.add(executor.submit(_scan, reference))
+    return graph
+
+
+def list_graph_dependencies(graph, categories=None):
+    """
+    Merge and resolve all dependencies of a graph returned by
+    scan_scenes_dependencies.
+    :param tuple[str]|None categories: filter categories.
+    :rtype: list[str]
+    """
+    categories = categories or DEPENDENCY_CATEGORIES
+    paths = set()
+    for scene_path, dependencies in graph.items():
+        for category in categories:
+            for path in dependencies.get(category, []):
+                paths.add(resolve_dependency_path(path, scene_path))
+    return sorted(paths)
+
+
+def list_missing_dependencies(graph, categories=None):
+    return [
+        path for path in list_graph_dependencies(graph, categories)
+        if not os.path.exists(path)]
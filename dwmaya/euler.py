@@ -0,0 +1,102 @@
+"""
+Vectorized euler rotations math, following Maya conventions (row vectors,
+rotate order applied from the first axis to the last one). Angles are in
+radians.
+"""
+
+__author__ = 'Olivier Evers'
+__copyright__ = 'DreamWall'
+__license__ = 'MIT'
+
+
+import numpy as np
+
+
+# Indices of the maya rotateOrder enum.
+ROTATE_ORDERS = ('xyz', 'yzx', 'zxy', 'xzy', 'yxz', 'zyx')
+_NEXT_AXIS = (1, 2, 0, 1)
+_EPSILON = 1e-9
+
+
+def _axis_rotation_matrices(angles, axis):
+    """Maya (row vectors) rotation matrices around one axis."""
+    cos, sin = np.cos(angles), np.sin(angles)
+    matrices = np.zeros(angles.shape + (3, 3))
+    i, j, k = axis, (axis + 1) % 3, (axis + 2) % 3
+    matrices[..., i, i] = 1
+    matrices[..., j, j] = cos
+    matrices[..., j, k] = sin
+    matrices[..., k, j] = -sin
+    matrices[..., k, k] = cos
+    return matrices
+
+
+def euler_to_matrices(rotations, rotate_order='xyz'):
+    """
+    :param np.ndarray rotations: (..., 3) x, y, z angles in radians.
+    :return: (..., 3, 3) rotation matrices.
+    """
+    axes = ['xyz'.index(axis) for axis in rotate_order]
+    matrices = _axis_rotation_matrices(rotations[..., axes[0]], axes[0])
+    for axis in axes[1:]:
+        matrices = matrices @ _axis_rotation_matrices(
+            rotations[..., axis], axis)
+    return matrices
+
+
+def matrices_to_euler(matrices, rotate_order='xyz'):
+    """
+    :param np.ndarray matrices: (..., 3, 3) orthonormal rotation matrices.
+    :return: (..., 3) x, y, z angles in radians.
+    """
+    axes = ['xyz'.index(axis) for axis in rotate_order]
+    i = axes[0]
+    parity = int((axes[1] - axes[0]) % 3 != 1)
+    j = _NEXT_AXIS[i + parity]
+    k = _NEXT_AXIS[i - parity + 1]
+    # Column vectors convention.
+    m = np.swapaxes(matrices, -1, -2)
+    cos_y = np.hypot(m[..., i, i], m[..., j, i])
+    regular = cos_y > _EPSILON  # Else gimbal lock.
+    first = np.where(
+        regular,
+        np.arctan2(m[..., k, j], m[..., k, k]),
+        np.arctan2(-m[..., j, k], m[..., j, j]))
+    second = np.arctan2(-m[..., k, i], cos_y)
+    third = np.where(regular, np.arctan2(m[..., j, i], m[..., i, i]), 0)
+    if parity:
+        first, second, third = -first, -second, -third
+    rotations = np.empty(matrices.shape[:-2] + (3,))
+    rotations[..., i] = first
+    rotations[..., j] = second
+    rotations[..., k] = third
+    return rotations
+
+
+def _closest_turn(angles, references):
+    return angles + 2 * np.pi * np.round((references - angles) / (2 * np.pi))
+
+
+def apply_euler_continuity(rotations, rotate_order='xyz'):
+    """
+    Choose, frame after frame, the equivalent rotation closest to the
+    previous one (avoid 360 degrees jumps and flips).
+    :param np.ndarray rotations: (frames, ..., 3) radians.
+    :rtype: np.ndarray
+    """
+    rotations = np.array(rotations, dtype=np.float64)
+    first, second, third = ['xyz'.index(axis) for axis in rotate_order]
+    alternatives = rotations.copy()
+    alternatives[..., first] += np.pi
+    alternatives[..., second] = np.pi - alternatives[..., second]
+    alternatives[..., third] += np.pi
+    for frame in range(1, len(rotations)):
+        previous = rotations[frame - 1]
+        candidate = _closest_turn(rotations[frame], previous)
+        alternative = _closest_turn(alternatives[frame], previous)
+        use_alternative = (
+            np.abs(alternative - previous).sum(axis=-1) <
+            np.abs(candidate - previous).sum(axis=-1))
+        rotations[frame] = np.where(
+            use_alternative[..., None], alternative, candidate)
+    return rotations
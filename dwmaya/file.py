@@ -1,22 +1,22 @@
 import os
 import re
-import shutil
 import codecs
 import tempfile
-from datetime import datetime as Datetime
 from contextlib import contextmanager
 
 import maya.cmds as mc
 import maya.mel as mm
 
+from dwmaya.ascii import (
+    MAYA_ASCII_DATE_PREFIX, maya_dateformat_to_datetime,
+    read_maya_ascii_header)
 from dwmaya.hierarchy import temporarily_reparent_transform_children
+from dwmaya.mayabinary import detect_filepaths_in_maya_binary_file
 from dwmaya.node import temporary_nodename
+from dwmaya.pathremap import remap_filepaths_in_file
 from dwmaya.selection import preserve_selection
 
 
-MAYA_ASCII_DATE_PREFIX = '//Last modified: '
-
-
 def check_if_scene_is_saved(check_modified=True):
     scene_path = mc.file(query=True, sceneName=True)
     if not scene_path:
@@ -122,6 +122,8 @@ def export_node_content(
 
 
 def detect_filepaths_in_maya_file(maya_file_path, root):
+    if maya_file_path.lower().endswith('.mb'):
+        return detect_filepaths_in_maya_binary_file(maya_file_path, root)
     pattern = rf'"{ root}(.*?)"'
     detected = []
     with codecs.open(maya_file_path, 'r', encoding='iso-8859-1') as mayascii:
@@ -132,43 +134,22 @@ def detect_filepaths_in_maya_file(maya_file_path, root):
 
 def switch_filepaths_in_maya_file(
         maya_file_path, sources_destinations, overwrite_file=False):
-    filename = os.path.basename(maya_file_path)
-    directory = tempfile.gettempdir()
-    clean = f'{directory}/{os.path.splitext(filename)[0]}_clean.ma'
-    with open(clean, 'w') as f:
-        with codecs.open(maya_file_path, 'r', encoding='iso-8859-1') as mayascii:
-            for line in mayascii:
-                for source, destination in sources_destinations:
-                    line = line.replace(source, destination)
-                f.write(line)
-    if not overwrite_file:
-        return clean
-    shutil.copy2(clean, maya_file_path)
-    return maya_file_path
-
-
-def maya_dateformat_to_datetime(maya_ascii_date):
-    """
-    Example:
-    //Last modified: Tue, May 07, 2024 11:27:08 AM
-    """
-    datetime = maya_ascii_date.split(MAYA_ASCII_DATE_PREFIX)[-1]
-    _, month, day, year, time, period = datetime.strip().split(' ')
-    datetime = f'{year} {month} {day[:-1]} {time} {period}'
-    try:
-        return Datetime.strptime(datetime, '%Y %b %d %I:%M:%S %p')
-    except:
-        print(f'Could not parse "{datetime}"')
-        raise
+    if overwrite_file:
+        output_path = maya_file_path
+    else:
+        filename = os.path.basename(maya_file_path)
+        directory = tempfile.gettempdir()
+        output_path = f'{directory}/{os.path.splitext(filename)[0]}_clean.ma'
+    output_path, _ = remap_filepaths_in_file(
+        maya_file_path, sources_destinations, output_path)
+    return output_path
 
 
 def get_maya_ascii_scene_date(maya_scene_path):
-    with codecs.open(maya_scene_path, 'r', encoding='iso-8859-1') as mayascii:
-        for line in mayascii:
-            if line.startswith(MAYA_ASCII_DATE_PREFIX):
-                return maya_dateformat_to_datetime(line)
-            if not line.startswith('//'):
-                raise Exception('Date not found.')
+    date = read_maya_ascii_header(maya_scene_path).last_modified
+    if date is None:
+        raise Exception('Date not found.')
+    return date
 
 
 @preserve_maya_scenename
@@ -0,0 +1,176 @@
+"""
+Scene frame rate conversion keeping the animation timing in seconds.
+
+Everything holding a time is remapped by the same rational factor
+(target fps / source fps): keys of all the time based curves, shots, audio
+nodes, image planes frame offsets and playback ranges.
+Example:
+    report = convert_scene_frame_rate('pal')  # 24 -> 25 fps
+    report['factor']  # '25/24'
+"""
+
+__author__ = 'Olivier Evers'
+__copyright__ = 'DreamWall'
+__license__ = 'MIT'
+
+
+from fractions import Fraction
+
+import numpy as np
+import maya.cmds as mc
+import maya.api.OpenMaya as om2
+
+from dwmaya.animation import get_anim_curves, node_names_to_mfn_anim_curves
+from dwmaya.asciianimation import TIME_UNIT_FRAME_RATES
+from dwmaya.keyframe import find_colliding_keys, set_keys_times
+
+
+_SHOT_ATTRIBUTES = (
+    'startFrame', 'endFrame', 'sequenceStartFrame', 'sequenceEndFrame')
+_PLAYBACK_OPTIONS = (
+    'animationStartTime', 'minTime', 'maxTime', 'animationEndTime')
+
+
+def get_frame_rate(time_unit=None):
+    """
+    :param str|None time_unit: Maya time unit, default is the current one.
+    :rtype: Fraction
+    """
+    time_unit = time_unit or mc.currentUnit(query=True, time=True)
+    if time_unit in TIME_UNIT_FRAME_RATES:
+        return Fraction(TIME_UNIT_FRAME_RATES[time_unit]).limit_denominator()
+    if not time_unit.endswith('fps'):
+        raise ValueError(f'Unknown time unit: {time_unit}')
+    return Fraction(time_unit[:-3])
+
+
+def get_time_unit(frame_rate):
+    """Maya time unit name of a frame rate (e.g. 25 -> 'pal')."""
+    frame_rate = Fraction(str(frame_rate))
+    for time_unit, rate in TIME_UNIT_FRAME_RATES.items():
+        if rate == frame_rate:
+            return time_unit
+    return f'{float(frame_rate):g}fps'
+
+
+def remap_frames(frames, factor, pivot=0, snap=None):
+    """
+    :param np.ndarray frames:
+    :param Fraction factor:
+    :param float pivot: frame which doesn't move.
+    :param float|None snap: round results to multiples of this step.
+    :rtype: np.ndarray
+    """
+    frames = np.asarray(frames, dtype=np.float64)
+    frames = pivot + (frames - pivot) * factor.numerator / factor.denominator
+    if snap:
+        frames = np.round(frames / snap) * snap
+    return frames
+
+
+def _read_anim_curves_times(mfn_anim_curves, time_unit):
+    return [
+        np.array([
+            curve.input(k).asUnits(time_unit)
+            for k in range(curve.numKeys)])
+        for curve in mfn_anim_curves]
+
+
+def _sorted_shots(shots, forward):
+    shots = sorted(shots, key=lambda s: mc.getAttr(s + '.sequenceStartFrame'))
+    return shots[::-1] if forward else shots
+
+
+def convert_scene_frame_rate(time_unit, pivot=0, snap=1.0, anim_curves=None):
+    """
+    Change the scene time unit and remap all the scene times so the
+    animation keeps the same timing in seconds.
+    :param str|float time_unit: Maya time unit or frame rate.
+    :param float pivot: frame number which doesn't change.
+    :param float|None snap: snap keys and shots frames to multiples of this
+        step (after conversion), None to keep sub-frames.
+    :param list[str]|None anim_curves: default is all the time based curves.
+    :return:
+        dict(
+            factor=str,
+            curves=int,
+            keys=int,
+            removed_keys=int,
+            shots=list[str],
+            audio=list[str],
+            image_planes=list[str])
+    :rtype: dict
+    """
+    if not isinstance(time_unit, str):
+        time_unit = get_time_unit(time_unit)
+    factor = get_frame_rate(time_unit) / get_frame_rate()
+
+    def remap(frame, pivot=pivot, snap=snap):
+        return float(remap_frames(frame, factor, pivot, snap))
+
+    # Read everything in the source unit.
+    source_unit = om2.MTime.uiUnit()
+    mfn_anim_curves = node_names_to_mfn_anim_curves(
+        anim_curves or get_anim_curves())
+    times = _read_anim_curves_times(mfn_anim_curves, source_unit)
+    shots = {
+        shot: [mc.getAttr(f'{shot}.{a}') for a in _SHOT_ATTRIBUTES]
+        for shot in mc.ls(type='shot')}
+    audio = {
+        node: [mc.getAttr(f'{node}.{a}') for a in (
+            'offset', 'sourceStart', 'sourceEnd')]
+        for node in mc.ls(type='audio')}
+    image_planes = {
+        node: mc.getAttr(node + '.frameOffset')
+        for node in mc.ls(type='imagePlane')
+        if not mc.referenceQuery(node, isNodeReferenced=True)}
+    playback = {
+        option: mc.playbackOptions(query=True, **{option: True})
+        for option in _PLAYBACK_OPTIONS}
+
+    mc.currentUnit(time=time_unit, updateAnimation=False)
+    target_unit = om2.MTime.uiUnit()
+
+    removed_count = 0
+    for curve, curve_times in zip(mfn_anim_curves, times):
+        if not len(curve_times):
+            continue
+        exact_times = remap_frames(curve_times, factor, pivot)
+        new_times = remap_frames(curve_times, factor, pivot, snap)
+        removed = find_colliding_keys(exact_times, new_times)
+        removed_count += len(removed)
+        # Tangents are stored in seconds: keep them as they were.
+        set_keys_times(curve, new_times, target_unit, removed)
+
+    forward = factor > 1
+    for shot in _sorted_shots(shots, forward):
+        start, end, sequence_start, sequence_end = shots[shot]
+        values = (
+            remap(start), remap(end), remap(sequence_start),
+            remap(sequence_end))
+        # Grow before shrinking to never get an end before the start.
+        attributes = list(zip(_SHOT_ATTRIBUTES, values))
+        order = (1, 0, 3, 2) if forward else (0, 1, 2, 3)
+        for index in order:
+            attribute, value = attributes[index]
+            mc.setAttr(f'{shot}.{attribute}', value)
+
+    for node, (offset, source_start, source_end) in audio.items():
+        mc.setAttr(node + '.sourceStart', remap(source_start, 0, None))
+        mc.setAttr(node + '.sourceEnd', remap(source_end, 0, None))
+        mc.setAttr(node + '.offset', remap(offset))
+
+    for node, offset in image_planes.items():
+        mc.setAttr(node + '.frameOffset', round(remap(offset, 0, None)))
+
+    mc.playbackOptions(**{
+        option: remap(value) for option, value in playback.items()})
+
+    return dict(
+        factor=str(factor),
+        curves=len([t for t in times if len(t)]),
+        keys=int(sum(len(t) for t in times)) - removed_count,
+        removed_keys=removed_count,
+        shots=sorted(shots),
+        audio=sorted(audio),
+        image_planes=sorted(image_planes))
@@ -1,7 +1,11 @@
-from functools import partial
+import numpy as np
 import maya.cmds as mc
-from __curve import (
+import maya.api.OpenMaya as om2
+import maya.api.OpenMayaAnim as oma2
+
+from dwmaya.animation import (
     list_non_static_anim_curves, node_names_to_mfn_anim_curves)
+from dwmaya.apiundo import commit
 
 
 def find_last_keyframe_time(anim_curves=None):
@@ -36,6 +40,249 @@ def remove_keys_before(anim_curves, time, to_preserve=None):
             anim_curve.remove(i)
 
 
+def warp_frames(frames, source_frames, target_frames):
+    """
+    Piecewise linear time warp. Frames before the first source frame and
+    after the last one are offset like the first/last one.
+    A source frame given twice makes a jump: frames on it get the first
+    target frame, frames after it are offset from the second one.
+    :param np.ndarray frames:
+    :param list[float] source_frames: non decreasing.
+    :param list[float] target_frames: non decreasing.
+    :rtype: np.ndarray
+    """
+    frames = np.asarray(frames, dtype=np.float64)
+    source_frames = np.asarray(source_frames, dtype=np.float64)
+    target_frames = np.asarray(target_frames, dtype=np.float64)
+    warped = np.interp(frames, source_frames, target_frames)
+    on_source = np.isin(frames, source_frames)
+    warped[on_source] = target_frames[np.searchsorted(
+        source_frames, frames[on_source], side='left')]
+    before = frames < source_frames[0]
+    after = frames > source_frames[-1]
+    warped[before] = target_frames[0] + frames[before] - source_frames[0]
+    warped[after] = target_frames[-1] + frames[after] - source_frames[-1]
+    return warped
+
+
+def find_colliding_keys(exact_times, new_times):
+    """
+    Snapping can move several keys on the same frame. Keep the key which is
+    the closest to it.
+    :return: indices of the keys to remove.
+    :rtype: np.ndarray
+    """
+    unique, inverse = np.unique(new_times, return_inverse=True)
+    if len(unique) == len(new_times):
+        return np.array([], dtype=int)
+    distances = np.abs(np.asarray(exact_times) - new_times)
+    order = np.lexsort((distances, inverse))
+    kept = order[np.r_[True, inverse[order][1:] != inverse[order][:-1]]]
+    return np.setdiff1d(np.arange(len(new_times)), kept)
+
+
+def find_crossed_keys(new_times, moved=None):
+    """
+    Moving keys can make them cross other keys. The keys which don't move
+    and are covered by the moved keys new range are replaced by the moved
+    animation. Then keys ending before a previous key are removed.
+    :param np.ndarray new_times:
+    :param np.ndarray|None moved: mask of the keys which move, default is
+        all the keys.
+    :return: indices of the keys to remove.
+    :rtype: np.ndarray
+    """
+    new_times = np.asarray(new_times, dtype=np.float64)
+    crossed = np.zeros(len(new_times), dtype=bool)
+    if moved is not None and moved.any() and not moved.all():
+        moved_times = new_times[moved]
+        crossed = ~moved & (
+            (new_times >= moved_times.min()) &
+            (new_times <= moved_times.max()))
+    remaining = np.flatnonzero(~crossed)
+    times = new_times[remaining]
+    previous = np.maximum.accumulate(np.r_[-np.inf, times[:-1]])
+    crossed[remaining[times < previous]] = True
+    return np.flatnonzero(crossed)
+
+
+def set_keys_times(
+        curve, new_times, time_unit, removed=(), tangent_scales=None,
+        change=None):
+    """
+    Remove keys and move the others, keeping their order.
+    :param maya.api.OpenMayaAnim.MFnAnimCurve curve:
+    :param np.ndarray new_times: one per key, including the removed ones.
+        Remaining keys times have to be strictly increasing (see
+        find_colliding_keys and find_crossed_keys).
+    :param removed: indices of the keys to remove.
+    :param tuple[np.ndarray, np.ndarray]|None tangent_scales: in and out time
+        scale per key (including the removed ones) applied to fixed and
+        weighted tangents. These are kept as they are by default.
+    :param maya.api.OpenMayaAnim.MAnimCurveChange|None change:
+    """
+    removed = np.asarray(removed, dtype=int)
+    new_times = np.delete(new_times, removed)
+    if np.any(np.diff(new_times) <= 0):
+        raise ValueError(
+            f'Keys of {curve.name()} would change order or overlap.')
+    for index in removed[::-1]:
+        curve.remove(int(index), change)
+    if tangent_scales is not None:
+        tangent_scales = [np.delete(s, removed) for s in tangent_scales]
+    fixed = oma2.MFnAnimCurve.kTangentFixed
+    tangents = []
+    for k in range(curve.numKeys):
+        if curve.isWeighted or fixed in (
+                curve.inTangentType(k), curve.outTangentType(k)):
+            tangents.append((
+                k, curve.getTangentXY(k, True), curve.getTangentXY(k, False)))
+    # Move the keys going backward first, from the first one, then the ones
+    # going forward from the last one: a key never reaches a neighbour which
+    # didn't move yet.
+    current_times = np.array([
+        curve.input(k).asUnits(time_unit) for k in range(curve.numKeys)])
+    forward = np.flatnonzero(new_times > current_times)
+    backward = np.flatnonzero(new_times < current_times)
+    for k in np.concatenate((backward, forward[::-1])):
+        curve.setInput(int(k), om2.MTime(new_times[k], time_unit), change)
+    for k, (in_x, in_y), (out_x, out_y) in tangents:
+        if tangent_scales is not None:
+            in_x *= tangent_scales[0][k]
+            out_x *= tangent_scales[1][k]
+        locked = curve.tangentsLocked(k)
+        curve.setTangentsLocked(k, False, change)
+        # getTangentXY values are unconverted.
+        curve.setTangent(k, in_x, in_y, True, change, convertUnits=False)
+        curve.setTangent(k, out_x, out_y, False, change, convertUnits=False)
+        curve.setTangentsLocked(k, locked, change)
+
+
+def _insert_keys(curve, time, change):
+    """Insert a linear key without changing the curve value."""
+    if curve.find(time) is not None:
+        return
+    linear = oma2.MFnAnimCurve.kTangentLinear
+    curve.addKey(time, curve.evaluate(time), linear, linear, change)
+
+
+def warp_animation_curves(
+        animation_curves, source_frames, target_frames, snap_keys=False,
+        boundary_frames=None, clear_range=None, warp_range=None,
+        held_keys=None, scale_tangents=True):
+    """
+    Apply a piecewise linear time warp to the keys of all the curves in one
+    pass. See warp_frames. The edit is a single step in the Maya undo queue.
+    :param list[str] animation_curves: animation curves names
+    :param list[float] source_frames:
+    :param list[float] target_frames:
+    :param bool snap_keys: round to the closest int the new time of the keys
+        ending between the first and the last target frames. When several
+        keys end on the same frame, the closest one is kept.
+    :param list[float]|None boundary_frames: frames to key before warping,
+        to preserve the animation around them.
+    :param tuple[float, float]|None clear_range: remove the keys between
+        these frames (excluded), before warping.
+    :param tuple[float, float]|None warp_range: only warp the keys between
+        these frames (included), others don't move. The ones covered by the
+        warped keys are removed.
+    :param dict|None held_keys: {source frame: target frame} copy the value
+        at source frame (before warp) to target frame (after warp), with
+        linear tangents.
+    :param bool scale_tangents: scale fixed and weighted tangents with the
+        warp slope on each side of the keys.
+    """
+    time_unit = om2.MTime.uiUnit()
+    change = oma2.MAnimCurveChange()
+    try:
+        _warp_animation_curves(
+            change, time_unit, animation_curves, source_frames,
+            target_frames, snap_keys, boundary_frames, clear_range,
+            warp_range, held_keys or {}, scale_tangents)
+    except BaseException:
+        change.undoIt()
+        raise
+    commit(change.undoIt, change.redoIt)
+
+
+def _warp_animation_curves(
+        change, time_unit, animation_curves, source_frames, target_frames,
+        snap_keys, boundary_frames, clear_range, warp_range, held_keys,
+        scale_tangents):
+    curves = node_names_to_mfn_anim_curves(animation_curves)
+    linear = oma2.MFnAnimCurve.kTangentLinear
+
+    held_values = []
+    for curve in curves:
+        for frame in boundary_frames or []:
+            _insert_keys(curve, om2.MTime(frame, time_unit), change)
+        held_values.append([
+            curve.evaluate(om2.MTime(frame, time_unit))
+            for frame in held_keys])
+
+    # Warp all the keys of all the curves at once.
+    counts = [curve.numKeys for curve in curves]
+    times = np.array([
+        curve.input(k).asUnits(time_unit)
+        for curve in curves for k in range(curve.numKeys)])
+    exact_times = warp_frames(times, source_frames, target_frames)
+    tangent_scales = None
+    if scale_tangents:
+        # Tangents follow the warp slope on each side of the keys.
+        delta = 1e-3
+        in_scales = (exact_times - warp_frames(
+            times - delta, source_frames, target_frames)) / delta
+        out_scales = (warp_frames(
+            times + delta, source_frames, target_frames) - exact_times) / delta
+    moved = np.ones(len(times), dtype=bool)
+    if warp_range is not None:
+        moved = (times >= warp_range[0]) & (times <= warp_range[1])
+        exact_times[~moved] = times[~moved]
+        if scale_tangents:
+            in_scales[~moved] = out_scales[~moved] = 1
+    new_times = exact_times.copy()
+    if snap_keys:
+        snapped = (
+            (exact_times >= min(target_frames)) &
+            (exact_times <= max(target_frames)))
+        new_times[snapped] = np.round(exact_times[snapped])
+    cleared = np.zeros(len(times), dtype=bool)
+    if clear_range is not None:
+        cleared = (times > clear_range[0]) & (times < clear_range[1])
+
+    ends = np.cumsum(counts)
+    for curve, start, end, values in zip(
+            curves, ends - counts, ends, held_values):
+        curve_times = new_times[start:end]
+        kept = np.flatnonzero(~cleared[start:end])
+        crossed = kept[find_crossed_keys(
+            curve_times[kept], moved[start:end][kept])]
+        kept = np.setdiff1d(kept, crossed)
+        collisions = kept[find_colliding_keys(
+            exact_times[start:end][kept], curve_times[kept])]
+        removed = np.setdiff1d(
+            np.arange(end - start), np.setdiff1d(kept, collisions))
+        if scale_tangents:
+            tangent_scales = in_scales[start:end], out_scales[start:end]
+        set_keys_times(
+            curve, curve_times, time_unit, removed, tangent_scales, change)
+        for (source_frame, target_frame), value in zip(
+                held_keys.items(), values):
+            source_index = curve.find(om2.MTime(
+                float(warp_frames(
+                    [source_frame], source_frames, target_frames)[0]),
+                time_unit))
+            if source_index is not None:
+                curve.setOutTangentType(source_index, linear, change)
+            time = om2.MTime(target_frame, time_unit)
+            index = curve.find(time)
+            if index is None:
+                curve.addKey(time, value, linear, linear, change)
+            else:
+                curve.setValue(index, value, change)
+                curve.setInTangentType(index, linear, change)
+
+
 def trim_animation_curves(animation_curves, start_frame, end_frame):
     """
     Trim animation from given range.
@@ -43,32 +290,12 @@ def trim_animation_curves(animation_curves, start_frame, end_frame):
     :param float start_frame:
     :param float end_frame:
     """
-    # Key handle boundaries.
-    mc.setKeyframe(
+    warp_animation_curves(
         animation_curves,
-        time=start_frame,
-        insert=True,
-        inTangentType="linear",
-        outTangentType="linear")
-    mc.setKeyframe(
-        animation_curves,
-        time=end_frame,
-        insert=True,
-        inTangentType="linear",
-        outTangentType="linear")
-    # Clear keyframes in range.
-    time_range = start_frame + 1, end_frame - 1
-    mc.cutKey(animation_curves, clear=True, time=time_range)
-    # Adapt animation.
-    last_key = max(mc.keyframe(animation_curves, query=True))
-    offset = end_frame - start_frame - 1
-    mc.keyframe(
-        animation_curves,
-        edit=True,
-        time=(end_frame, last_key),
-        relative=True,
-        timeChange=-offset,
-        option='over')
+        source_frames=[start_frame, end_frame],
+        target_frames=[start_frame, start_frame + 1],
+        boundary_frames=[start_frame, end_frame],
+        clear_range=(start_frame, end_frame))
 
 
 def hold_animation_curves(
@@ -79,39 +306,23 @@ def hold_animation_curves(
     :param float frame:
     :param float duration:
     :param bool offset_contiguous_animation:
-        shift the animation before and after the scale to match the new timing.
+        shift the animation set after the held frame beyond the hold
+        duration. Else the animation during the hold is cleared.
     """
-    # Keyframe and copy at given time to hold.
-    mc.setKeyframe(
-        animation_curves,
-        time=frame,
-        inTangentType="linear",
-        outTangentType="linear")
-    mc.copyKey(animation_curves, time=(frame, frame))
-
     if offset_contiguous_animation:
-        # Shift the animation set after the held frame beyond
-        # the hold duration.
-        last_key = max(mc.keyframe(animation_curves, query=True))
-        time_range = (frame + 1, last_key + 1)
-        mc.keyframe(
-            animation_curves,
-            edit=True,
-            time=time_range,
-            relative=True,
-            timeChange=duration,
-            option='over')
+        # Keys after the frame jump by the duration.
+        source_frames = [frame, frame]
+        target_frames = [frame, frame + duration]
+        clear_range = None
     else:
-        # Clear the range to hold the animation.
-        time_range = (frame + 1, frame + duration)
-        mc.cutKey(animation_curves, clear=True, time=time_range)
-
-    time_range = (frame + duration, frame + duration)
-    mc.pasteKey(animation_curves, time=time_range)
-    # flat the held animation.
-    mc.keyTangent(animation_curves, time=time_range, inTangentType='linear')
-    time_range = (frame, frame)
-    mc.keyTangent(animation_curves, time=time_range, outTangentType='linear')
+        source_frames = target_frames = [frame]
+        clear_range = frame, frame + duration
+    # Keys are only offset. The warp slope on the held frame is a jump which
+    # must not stretch its tangents.
+    warp_animation_curves(
+        animation_curves, source_frames, target_frames,
+        boundary_frames=[frame], clear_range=clear_range,
+        held_keys={frame: frame + duration}, scale_tangents=False)
 
 
 def retime_animation_curves(
@@ -132,46 +343,15 @@ def retime_animation_curves(
         shift the animation before and after the scale to match the new timing.
     :param bool snap_key: round the new key frame time to the closest int.
     """
-    # Define offsets happening before and after:
-    end_offset = new_end_frame - end_frame
-    start_offset = new_start_frame - start_frame
-
-    # Define offset functions:
-    keys = mc.keyframe(animation_curves, query=True)
-    max_keyframe = max(keys) + start_offset + end_offset
-    offset_after_function = partial(
-        mc.keyframe, animation_curves, edit=True,
-        t=(end_frame + 1, max_keyframe), relative=True,
-        timeChange=end_offset, option='over')
-    min_keyframe = min(keys) - end_offset - start_offset
-    offset_before_function = partial(
-        mc.keyframe, animation_curves, edit=True,
-        t=(min_keyframe, start_frame - 1), relative=True,
-        timeChange=start_offset, option='over')
-
+    warp_range = None
+    if not offset_contiguous_animation:
+        warp_range = start_frame, end_frame
+    boundary_frames = None
     if add_boundary_keyframes:
-        mc.setKeyframe(
-            animation_curves, time=start_frame, inTangentType="linear",
-            outTangentType="linear")
-        mc.setKeyframe(
-            animation_curves, time=end_frame, inTangentType="linear",
-            outTangentType="linear")
-
-    # Offsets in case of expansion:
-    if offset_contiguous_animation and end_offset > 0:
-        offset_after_function()
-    if offset_contiguous_animation and start_offset < 0:
-        offset_before_function()
-
-    # Retime/scale animation:
-    mc.scaleKey(
-        animation_curves, time=(start_frame, end_frame),
-        newStartTime=new_start_frame, newEndTime=new_end_frame)
-    if snap_keys:
-        mc.snapKey(animation_curves, t=(new_start_frame, new_end_frame))
-
-    # Offsets in case of shrinking:
-    if offset_contiguous_animation and end_offset < 0:
-        offset_after_function()
-    if offset_contiguous_animation and start_offset > 0:
-        offset_before_function()
+        boundary_frames = [start_frame, end_frame]
+    warp_animation_curves(
+        animation_curves,
+        source_frames=[start_frame, end_frame],
+        target_frames=[new_start_frame, new_end_frame],
+        snap_keys=snap_keys, boundary_frames=boundary_frames,
+        warp_range=warp_range)
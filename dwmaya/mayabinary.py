@@ -0,0 +1,153 @@
+"""
+Offline Maya binary (.mb) reader. Doesn't need Maya.
+
+Maya binary files are IFF files. Groups (FOR4, LIS4, CAT4, PROP) contain a
+form type and sub-chunks. Files saved with 64 bits offsets use FOR8, LIS8,
+etc. groups with 8 bytes sizes and 8 bytes alignment.
+The file is memory mapped and only the interesting chunks are copied.
+"""
+
+__author__ = 'Olivier Evers'
+__copyright__ = 'DreamWall'
+__license__ = 'MIT'
+
+
+import re
+import mmap
+import struct
+from collections import namedtuple
+from contextlib import contextmanager
+
+from dwmaya.ascii import ENCODING
+
+
+GROUP_TAGS = (
+    b'FOR4', b'LIS4', b'CAT4', b'PROP',
+    b'FOR8', b'LIS8', b'CAT8', b'PRO8')
+HEADER_FORM = b'HEAD'
+VERSION_TAG = b'VERS'
+REQUIRES_TAG = b'PLUG'
+FILE_INFO_TAG = b'FINF'
+FILE_REFERENCE_TAG = b'FREF'
+STRING_ATTRIBUTE_TAG = b'STR '
+SCENE_EXTENSIONS = ('.ma', '.mb')
+
+_COPY_NUMBER = re.compile(r'\{\d+\}$')
+
+
+Chunk = namedtuple('Chunk', 'tag form offset size')
+
+
+@contextmanager
+def mapped_maya_binary_file(maya_file_path):
+    with open(maya_file_path, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield data
+        finally:
+            data.close()
+
+
+def is_maya_binary_data(data):
+    if data[:4] == b'FOR4':
+        return data[8:12] == b'Maya'
+    if data[:4] == b'FOR8':
+        return data[16:20] == b'Maya'
+    return False
+
+
+def _align(offset, alignment):
+    return (offset + alignment - 1) // alignment * alignment
+
+
+def iterate_over_maya_binary_chunks(data):
+    """
+    Walk the IFF tree and yield every data chunk (groups are traversed) with
+    the form type of the group containing it.
+    :param mmap.mmap|bytes data:
+    """
+    is_64 = data[:4] == b'FOR8'
+    header_size, size_format, alignment = (
+        (16, '>Q', 8) if is_64 else (8, '>L', 4))
+    size_offset = header_size - struct.calcsize(size_format)
+    end_of_data = len(data)
+    stack = [(0, end_of_data, None)]
+    while stack:
+        offset, end, form = stack.pop()
+        while offset + header_size <= end:
+            tag = data[offset:offset + 4]
+            size, = struct.unpack_from(
+                size_format, data, offset + size_offset)
+            start = offset + header_size
+            chunk_end = min(start + size, end_of_data)
+            offset = _align(chunk_end, alignment)
+            if tag in GROUP_TAGS:
+                # Continue this level later, walk the group content first.
+                stack.append((offset, end, form))
+                form = data[start:start + 4]
+                offset = _align(start + 4, alignment)
+                end = chunk_end
+                continue
+            yield Chunk(tag, form, start, chunk_end - start)
+
+
+def _read_strings(data, chunk):
+    content = data[chunk.offset:chunk.offset + chunk.size]
+    return [s.decode(ENCODING) for s in content.split(b'\0')]
+
+
+def _looks_like_path(value):
+    if '\n' in value:
+        return False
+    return value.count('/') > 1 or value.count('\\') > 1
+
+
+def read_maya_binary_file_info(maya_file_path):
+    """
+    Extract header and dependencies data from a Maya binary file.
+    :rtype: dict
+    return dict(
+        version=str,
+        requires=[(plugin, version), ...],
+        file_info={key: value},
+        references=[path, ...],
+        paths=[path, ...])  # String attributes looking like paths.
+    """
+    info = dict(
+        version=None, requires=[], file_info={}, references=[], paths=[])
+    with mapped_maya_binary_file(maya_file_path) as data:
+        if not is_maya_binary_data(data):
+            raise ValueError(f'Not a Maya binary file: {maya_file_path}')
+        for chunk in iterate_over_maya_binary_chunks(data):
+            if chunk.tag == STRING_ATTRIBUTE_TAG:
+                # Attribute name then value.
+                strings = _read_strings(data, chunk)
+                info['paths'].extend(
+                    s for s in strings[1:] if _looks_like_path(s))
+            elif chunk.tag == FILE_REFERENCE_TAG:
+                for string in _read_strings(data, chunk):
+                    path = _COPY_NUMBER.sub('', string)
+                    if path.lower().endswith(SCENE_EXTENSIONS):
+                        info['references'].append(path)
+                        break
+            elif chunk.form != HEADER_FORM:
+                continue
+            elif chunk.tag == VERSION_TAG:
+                info['version'] = _read_strings(data, chunk)[0]
+            elif chunk.tag == REQUIRES_TAG:
+                plugin, version = (_read_strings(data, chunk) + ['', ''])[:2]
+                info['requires'].append((plugin, version))
+            elif chunk.tag == FILE_INFO_TAG:
+                key, value = (_read_strings(data, chunk) + ['', ''])[:2]
+                info['file_info'][key] = value
+    return info
+
+
+def detect_filepaths_in_maya_binary_file(maya_file_path, root):
+    """
+    Same as dwmaya.file.detect_filepaths_in_maya_file for Maya binary files.
+    The mapped file is searched directly, without reading it in memory.
+    """
+    pattern = re.compile(re.escape(root.encode(ENCODING)) + rb'[^\0"\n]*')
+    with mapped_maya_binary_file(maya_file_path) as data:
+        return [m.group().decode(ENCODING) for m in pattern.finditer(data)]
@@ -0,0 +1,156 @@
+"""
+Offline file paths remapping in Maya ascii files. Doesn't need Maya.
+
+All the sources are compiled in a single prefix tree regex, so each file is
+read once whatever the number of paths to remap.
+Example:
+    remap_filepaths_in_file(
+        'shot.ma', [('/old/textures/', '/new/textures/'), ('C:/', 'D:/')])
+"""
+
+__author__ = 'Olivier Evers'
+__copyright__ = 'DreamWall'
+__license__ = 'MIT'
+
+
+import os
+import re
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from dwmaya.ascii import CHUNK_SIZE, ENCODING
+
+
+def _trie_pattern(node):
+    """
+    Build a regex from a trie of sources. Common prefixes are only tested once
+    and longest source wins.
+    """
+    alternatives = [
+        re.escape(bytes([character])) + _trie_pattern(node[character])
+        for character in sorted(k for k in node if k is not None)]
+    terminal = None in node
+    if not alternatives:
+        return b''
+    if len(alternatives) == 1 and not terminal:
+        return alternatives[0]
+    pattern = b'(?:' + b'|'.join(alternatives) + b')'
+    return pattern + b'?' if terminal else pattern
+
+
+def compile_sources_pattern(sources):
+    trie = {}
+    for source in sources:
+        node = trie
+        for character in source:
+            node = node.setdefault(character, {})
+        node[None] = True
+    return re.compile(_trie_pattern(trie))
+
+
+class PathRemapper(object):
+    def __init__(self, sources_destinations):
+        self.replacements = {}
+        for source, destination in sources_destinations:
+            if not source:
+                continue
+            self.replacements[source.encode(ENCODING)] = \
+                destination.encode(ENCODING)
+        self.pattern = compile_sources_pattern(self.replacements)
+        self.overlap = max(map(len, self.replacements), default=1) - 1
+
+    def remap_stream(self, input_stream, output_stream, chunk_size=CHUNK_SIZE):
+        """
+        Copy input to output and replace sources by destinations on the fly.
+        Returns the hit count per source.
+        :rtype: dict[str, int]
+        """
+        hits = {source: 0 for source in self.replacements}
+        if not self.replacements:
+            shutil.copyfileobj(input_stream, output_stream, chunk_size)
+            return {}
+        buffer = b''
+        while True:
+            chunk = input_stream.read(chunk_size)
+            buffer += chunk
+            # A source can be cut at the end of the buffer, keep enough
+            # bytes for the next iteration.
+            safe_end = len(buffer) - self.overlap if chunk else len(buffer)
+            position = 0
+            parts = []
+            for match in self.pattern.finditer(buffer):
+                if match.start() >= safe_end:
+                    break
+                source = match.group()
+                hits[source] += 1
+                parts.append(buffer[position:match.start()])
+                parts.append(self.replacements[source])
+                position = match.end()
+            end = max(position, safe_end)
+            parts.append(buffer[position:end])
+            output_stream.write(b''.join(parts))
+            buffer = buffer[end:]
+            if not chunk:
+                break
+        return {s.decode(ENCODING): count for s, count in hits.items()}
+
+
+def remap_filepaths_in_file(
+        maya_file_path, sources_destinations, output_path=None,
+        chunk_size=CHUNK_SIZE):
+    """
+    Replace paths in a Maya ascii file.
+    The result is written in a temporary file next to the destination and
+    then moved. The destination is never left half written.
+    :param str maya_file_path:
+    :param list[tuple[str, str]]|PathRemapper sources_destinations:
+    :param str|None output_path: default overwrites input file.
+    :return: output path and hit count per source.
+    :rtype: tuple[str, dict[str, int]]
+    """
+    remapper = sources_destinations
+    if not isinstance(remapper, PathRemapper):
+        remapper = PathRemapper(sources_destinations)
+    output_path = output_path or maya_file_path
+    directory = os.path.dirname(os.path.abspath(output_path))
+    handle, temp_path = tempfile.mkstemp(
+        prefix=f'.{os.path.basename(output_path)}.', dir=directory)
+    try:
+        with open(maya_file_path, 'rb') as input_stream, \
+                os.fdopen(handle, 'wb') as output_stream:
+            hits = remapper.remap_stream(
+                input_stream, output_stream, chunk_size)
+        shutil.copymode(maya_file_path, temp_path)
+        os.replace(temp_path, output_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return output_path, hits
+
+
+def _remap(arguments):
+    return remap_filepaths_in_file(*arguments)
+
+
+def remap_filepaths_in_files(
+        maya_file_paths, sources_destinations, output_directory=None,
+        max_workers=None):
+    """
+    Remap paths in many Maya ascii files in parallel processes.
+    :param list[str] maya_file_paths:
+    :param list[tuple[str, str]] sources_destinations:
+    :param str|None output_directory: default overwrites input files.
+    :rtype: dict[str, tuple[str, dict[str, int]]]
+    """
+    remapper = PathRemapper(sources_destinations)
+    arguments = []
+    for path in maya_file_paths:
+        output_path = None
+        if output_directory:
+            output_path = os.path.join(
+                output_directory, os.path.basename(path))
+        arguments.append((path, remapper, output_path))
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return dict(zip(maya_file_paths, executor.map(_remap, arguments)))
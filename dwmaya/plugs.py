@@ -0,0 +1,12 @@
+"""
+Plug name utilities. Doesn't need Maya.
+"""
+
+__author__ = 'Olivier Evers'
+__copyright__ = 'DreamWall'
+__license__ = 'MIT'
+
+
+def normalize_plug_name(plug):
+    """Plugs are compared by their short node name and short attribute."""
+    return plug.lstrip('|').split('|')[-1]
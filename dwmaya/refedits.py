@@ -0,0 +1,272 @@
+"""
+Offline reference edits analysis and pruning. Doesn't need Maya.
+
+Reference edits are stored in the ".ed" attribute of reference nodes:
+    setAttr ".ed" -type "dataReferenceEdits"
+        "chrRN"
+        "chrRN" 2
+        2 "|chr:rig|chr:ctrl" "translate" " -type \\"double3\\" 1 2 3"
+        5 4 "chrRN" "|chr:rig|chr:ctrl.tx" "chrRN.placeHolderList[1]" ""
+        "chr:propRN" 1
+        0 "|chr:prop" "|chr:rig" "-s -r ";
+Edits are gathered by the reference node owning the edited nodes, each group
+starts with the owner name and its edits count.
+"""
+
+__author__ = 'Olivier Evers'
+__copyright__ = 'DreamWall'
+__license__ = 'MIT'
+
+
+import os
+import re
+from collections import Counter, namedtuple
+
+from dwmaya.ascii import (
+    CHUNK_SIZE, CreateNode, FileReference, iterate_over_maya_ascii_records,
+    iterate_over_maya_ascii_statements, rewrite_maya_ascii_file,
+    unescape_maya_ascii_string)
+from dwmaya.asciiindex import build_maya_ascii_index
+
+
+REFERENCE_EDIT_TYPES = {
+    0: 'parent',
+    1: 'addAttr',
+    2: 'setAttr',
+    3: 'disconnectAttr',
+    4: 'deleteAttr',
+    5: 'connectAttr',
+    6: 'relationship',
+    7: 'lock',
+    8: 'unlock',
+}
+REFERENCE_EDITS_TYPE = '"dataReferenceEdits"'
+_RAW_TOKENS = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|[^\s"]+', re.DOTALL)
+
+
+ReferenceEdit = namedtuple(
+    'ReferenceEdit', 'reference_node owner edit_type target arguments raw')
+
+
+def is_reference_edits_statement(statement):
+    return (
+        statement.startswith('setAttr') and
+        REFERENCE_EDITS_TYPE in statement[:256])
+
+
+def _tokenize(text):
+    """
+    Return raw tokens (with quotes and escapes) and their value.
+    Strings continued with "+" are merged.
+    """
+    tokens = []
+    concatenate = False
+    for raw in _RAW_TOKENS.findall(text):
+        if raw == '+' and tokens and tokens[-1][2]:
+            concatenate = True
+            continue
+        quoted = raw.startswith('"')
+        value = unescape_maya_ascii_string(raw[1:-1]) if quoted else raw
+        if concatenate and quoted:
+            previous_raw, previous_value, _ = tokens[-1]
+            tokens[-1] = (
+                f'{previous_raw}\n\t\t+ {raw}', previous_value + value, True)
+        else:
+            tokens.append((raw, value, quoted))
+        concatenate = False
+    return tokens
+
+
+def _edit_target(edit_type, strings):
+    """Return the node affected by an edit."""
+    if not strings:
+        return None
+    if edit_type == 5 and len(strings) > 2:
+        # "refNode" "source" "destination"
+        source, destination = strings[1], strings[2]
+        plug = source if 'placeHolderList' in destination else destination
+    elif edit_type == 3 and len(strings) > 1:
+        plug = strings[1]
+    else:
+        plug = strings[0]
+    return plug.split('.')[0]
+
+
+def parse_reference_edits(statement):
+    """
+    Parse a setAttr ".ed" -type "dataReferenceEdits" statement.
+    :return: prefix (setAttr part), reference node name, edits per owner.
+    :rtype: tuple[str, str, list[tuple[str, list[ReferenceEdit]]]]
+    """
+    type_index = statement.index(REFERENCE_EDITS_TYPE)
+    type_end = type_index + len(REFERENCE_EDITS_TYPE)
+    prefix = statement[:type_end]
+    tokens = _tokenize(statement[type_end:])
+    if not tokens:
+        return prefix, None, []
+    reference_node = tokens[0][1]
+    groups = []
+    i = 1
+    while i + 1 < len(tokens):
+        owner, count = tokens[i][1], tokens[i + 1][1]
+        i += 2
+        edits = []
+        groups.append((owner, edits))
+        for n in range(int(count)):
+            start = i
+            i += 1  # edit type
+            while i < len(tokens) and not tokens[i][2]:
+                i += 1  # extra numeric flags
+            while i < len(tokens) and tokens[i][2]:
+                i += 1
+            is_last = n == int(count) - 1
+            if is_last and i < len(tokens):
+                i -= 1  # Next group owner name.
+            edit_tokens = tokens[start:i]
+            edit_type = int(edit_tokens[0][1])
+            strings = [v for _, v, quoted in edit_tokens if quoted]
+            edits.append(ReferenceEdit(
+                reference_node=reference_node,
+                owner=owner,
+                edit_type=REFERENCE_EDIT_TYPES.get(edit_type, str(edit_type)),
+                target=_edit_target(edit_type, strings),
+                arguments=[v for _, v, _ in edit_tokens[1:]],
+                raw=' '.join(raw for raw, _, _ in edit_tokens)))
+    return prefix, reference_node, groups
+
+
+def format_reference_edits(prefix, reference_node, groups):
+    lines = [prefix, f'"{reference_node}"']
+    for owner, edits in groups:
+        lines.append(f'"{owner}" {len(edits)}')
+        lines.extend(edit.raw for edit in edits)
+    return '\n\t\t'.join(lines)
+
+
+def iterate_over_reference_edits(maya_file_path):
+    for _, statement in iterate_over_maya_ascii_statements(maya_file_path):
+        if not is_reference_edits_statement(statement):
+            continue
+        for _, edits in parse_reference_edits(statement)[2]:
+            yield from edits
+
+
+def analyze_reference_edits(maya_file_path, top=20):
+    """
+    Count reference edits of a Maya ascii scene.
+    :param int top: number of heaviest nodes to report.
+    :rtype: dict
+    """
+    per_reference = Counter()
+    per_type = Counter()
+    per_reference_type = Counter()
+    per_node = Counter()
+    for edit in iterate_over_reference_edits(maya_file_path):
+        per_reference[edit.owner] += 1
+        per_type[edit.edit_type] += 1
+        per_reference_type[edit.owner, edit.edit_type] += 1
+        per_node[edit.target] += 1
+    return dict(
+        total=sum(per_type.values()),
+        per_reference=dict(per_reference.most_common()),
+        per_type=dict(per_type.most_common()),
+        per_reference_type={
+            f'{reference}.{type_}': count for (reference, type_), count in
+            per_reference_type.most_common()},
+        heaviest_nodes=per_node.most_common(top))
+
+
+def get_references_node_names(maya_file_path):
+    """
+    Offline list of the nodes available in each loaded .ma reference.
+    :return: {reference node: (namespace, set of node names)}
+    :rtype: dict[str, tuple[str, set[str]]]
+    """
+    references = {}
+    for record in iterate_over_maya_ascii_records(maya_file_path):
+        if isinstance(record, CreateNode):
+            break  # References are declared in the header.
+        if not isinstance(record, FileReference):
+            continue
+        if '-r' not in record.flags and '-reference' not in record.flags:
+            continue
+        path = os.path.expandvars(record.path or '')
+        if not path.lower().endswith('.ma') or not os.path.isfile(path):
+            continue
+        index = build_maya_ascii_index(path, write=False)
+        names = {node.name for node in index.nodes}
+        references[record.reference_node] = record.namespace, names
+    return references
+
+
+def is_edit_on_missing_node(edit, references_node_names):
+    """
+    An edit targeting a node which doesn't exist in the referenced file will
+    fail on load. Only direct children of the reference can be checked.
+    """
+    if edit.owner not in references_node_names or not edit.target:
+        return False
+    namespace, names = references_node_names[edit.owner]
+    name = edit.target.split('|')[-1]
+    if not name.startswith(f'{namespace}:'):
+        return False
+    name = name[len(namespace) + 1:]
+    if ':' in name:
+        return False  # Nested reference
+    return name not in names
+
+
+def prune_reference_edits(
+        maya_file_path, output_path, edit_types=None, missing_nodes=False,
+        reference_nodes=None, filter_function=None, chunk_size=CHUNK_SIZE):
+    """
+    Write a copy of the scene without the selected reference edits in a
+    single streaming pass.
+    :param str maya_file_path: source Maya ascii file.
+    :param str output_path: pruned copy.
+    :param list[str]|None edit_types: edit types to remove, e.g. ['setAttr'].
+    :param bool missing_nodes:
+        remove edits on nodes which don't exist in referenced file anymore
+        (those are the edits failing on load).
+    :param list[str]|None reference_nodes:
+        limit pruning to edits owned by those references.
+    :param callable|None filter_function:
+        custom function(ReferenceEdit) returning True to remove the edit.
+    :return: removed edits count per type.
+    :rtype: dict[str, int]
+    """
+    references_node_names = (
+        get_references_node_names(maya_file_path) if missing_nodes else {})
+    removed = Counter()
+
+    def must_remove(edit):
+        if reference_nodes and edit.owner not in reference_nodes:
+            return False
+        if edit_types and edit.edit_type in edit_types:
+            return True
+        if missing_nodes and is_edit_on_missing_node(
+                edit, references_node_names):
+            return True
+        return bool(filter_function and filter_function(edit))
+
+    def prune(_, statement):
+        if not is_reference_edits_statement(statement):
+            return statement
+        prefix, reference_node, groups = parse_reference_edits(statement)
+        pruned_groups = []
+        changed = False
+        for owner, edits in groups:
+            kept = []
+            for edit in edits:
+                if must_remove(edit):
+                    removed[edit.edit_type] += 1
+                    changed = True
+                else:
+                    kept.append(edit)
+            pruned_groups.append((owner, kept))
+        if not changed:
+            return statement
+        return format_reference_edits(prefix, reference_node, pruned_groups)
+
+    rewrite_maya_ascii_file(maya_file_path, output_path, prune, chunk_size)
+    return dict(removed)
@@ -0,0 +1,154 @@
+"""
+Sample plugs, world matrices and mesh points at any time without changing the
+current time. Values are evaluated through a DG context, the scene and the
+viewport are not updated for every frame.
+Example:
+    values = sample_plugs(['pCube1.translate', 'pCube1.rx'], range(1, 101))
+    values.shape  # (100 frames, 2 plugs, 3 components), NaN padded.
+"""
+
+__author__ = 'Olivier Evers'
+__copyright__ = 'DreamWall'
+__license__ = 'MIT'
+
+
+from contextlib import contextmanager
+
+import numpy as np
+import maya.api.OpenMaya as om2
+
+
+@contextmanager
+def dg_context(frame, time_unit=None):
+    """Make a DG context at the given time current."""
+    time = om2.MTime(frame, time_unit or om2.MTime.uiUnit())
+    previous_context = om2.MDGContext(time).makeCurrent()
+    try:
+        yield
+    finally:
+        previous_context.makeCurrent()
+
+
+def get_plugs(plug_names):
+    """
+    Resolve plugs at once. Array plugs (e.g. worldMatrix) are resolved to
+    their first element.
+    """
+    selection = om2.MSelectionList()
+    for plug_name in plug_names:
+        selection.add(plug_name)
+    plugs = []
+    for i in range(len(plug_names)):
+        plug = selection.getPlug(i)
+        if plug.isArray:
+            plug = plug.elementByLogicalIndex(0)
+        plugs.append(plug)
+    return plugs
+
+
+def _matrix_reader(plug):
+    def read():
+        return list(om2.MFnMatrixData(plug.asMObject()).matrix())
+    return read
+
+
+def _plug_reader(plug, ui_units=False):
+    """
+    Return a function reading the plug value(s) as a list of floats.
+    The reader is built once so the attribute type is only checked once.
+    """
+    if plug.isCompound:
+        readers = [
+            _plug_reader(plug.child(i), ui_units)
+            for i in range(plug.numChildren())]
+        return lambda: [value for r in readers for value in r()]
+    attribute = plug.attribute()
+    if attribute.hasFn(om2.MFn.kMatrixAttribute):
+        return _matrix_reader(plug)
+    if attribute.hasFn(om2.MFn.kTypedAttribute):
+        data_type = om2.MFnTypedAttribute(attribute).attrType()
+        if data_type == om2.MFnData.kMatrix:
+            return _matrix_reader(plug)
+        raise ValueError(f'Plug type not supported: {plug.name()}')
+    if ui_units and attribute.hasFn(om2.MFn.kUnitAttribute):
+        unit_type = om2.MFnUnitAttribute(attribute).unitType()
+        if unit_type == om2.MFnUnitAttribute.kDistance:
+            return lambda: [om2.MDistance.internalToUI(plug.asDouble())]
+        if unit_type == om2.MFnUnitAttribute.kAngle:
+            return lambda: [om2.MAngle.internalToUI(plug.asDouble())]
+        if unit_type == om2.MFnUnitAttribute.kTime:
+            unit = om2.MTime.uiUnit()
+            return lambda: [plug.asMTime().asUnits(unit)]
+    return lambda: [plug.asDouble()]
+
+
+def _sample(readers, frames, time_unit=None):
+    components = 0
+    samples = []
+    for frame in frames:
+        with dg_context(frame, time_unit):
+            values = [reader() for reader in readers]
+        components = max([components] + [len(v) for v in values])
+        samples.append(values)
+    array = np.full((len(samples), len(readers), components), np.nan)
+    for i, values in enumerate(samples):
+        for j, item_values in enumerate(values):
+            array[i, j, :len(item_values)] = item_values
+    return array
+
+
+def sample_plugs(plug_names, frames, ui_units=False, time_unit=None):
+    """
+    Evaluate plugs at the given frames. Compound plugs (translate...) give a
+    component per child, matrix plugs give 16 components.
+    :param list[str] plug_names:
+    :param list[float] frames:
+    :param bool ui_units: convert distances, angles and times to ui units
+        instead of internal units (centimeters, radians).
+    :return: array of shape (frames, plugs, components). Plugs with less
+        components than others are padded with NaN.
+    :rtype: np.ndarray
+    """
+    readers = [_plug_reader(p, ui_units) for p in get_plugs(plug_names)]
+    return _sample(readers, frames, time_unit)
+
+
+def sample_world_matrices(nodes, frames, time_unit=None):
+    """
+    :return: array of shape (frames, nodes, 16).
+    :rtype: np.ndarray
+    """
+    selection = om2.MSelectionList()
+    for node in nodes:
+        selection.add(node)
+    readers = []
+    for i in range(len(nodes)):
+        dag_path = selection.getDagPath(i)
+        plug = om2.MFnDependencyNode(dag_path.node()).findPlug(
+            'worldMatrix', False)
+        plug = plug.elementByLogicalIndex(dag_path.instanceNumber())
+        readers.append(_matrix_reader(plug))
+    return _sample(readers, frames, time_unit)
+
+
+def sample_mesh_points(mesh, frames, world_space=False, time_unit=None):
+    """
+    :param str mesh: mesh shape.
+    :return: array of shape (frames, points, 3).
+    :rtype: np.ndarray
+    """
+    selection = om2.MSelectionList()
+    selection.add(mesh)
+    dag_path = selection.getDagPath(0)
+    node = om2.MFnDependencyNode(dag_path.node())
+    if world_space:
+        plug = node.findPlug('worldMesh', False).elementByLogicalIndex(
+            dag_path.instanceNumber())
+    else:
+        plug = node.findPlug('outMesh', False)
+    samples = []
+    for frame in frames:
+        with dg_context(frame, time_unit):
+            points = om2.MFnMesh(plug.asMObject()).getPoints()
+        samples.append(np.array(points, dtype=np.float64)[:, :3])
+    return np.array(samples)
@@ -0,0 +1,261 @@
+"""
+Persistent scene library metadata cache. Doesn't need Maya.
+
+Scenes metadata (header, references, texture paths, node type counts) are
+stored in a SQLite database keyed by path. A scene is only scanned again
+when its size or modification time changed, failed scans included.
+Databases written with another schema version are rebuilt.
+Example:
+    library = SceneLibrary('/prod/.scenelibrary.db')
+    library.update(list_maya_ascii_files('/prod/ep01'))
+    library.list_scenes_referencing('/prod/assets/chr/rig/chr_rig.ma')
+"""
+
+__author__ = 'Olivier Evers'
+__copyright__ = 'DreamWall'
+__license__ = 'MIT'
+
+
+import os
+import json
+import sqlite3
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from dwmaya.ascii import (
+    iterate_over_maya_ascii_statements, parse_maya_ascii_statement,
+    read_maya_ascii_header)
+from dwmaya.dependencies import (
+    get_statement_dependencies, resolve_dependency_path)
+
+
+SCHEMA_VERSION = 2
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS scenes (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime INTEGER,
+    maya_version TEXT,
+    last_modified TEXT,
+    header TEXT);
+CREATE TABLE IF NOT EXISTS dependencies (
+    scene TEXT,
+    category TEXT,
+    path TEXT,
+    resolved_path TEXT);
+CREATE INDEX IF NOT EXISTS dependencies_scene ON dependencies(scene);
+CREATE INDEX IF NOT EXISTS dependencies_resolved_path
+    ON dependencies(resolved_path);
+CREATE TABLE IF NOT EXISTS node_types (
+    scene TEXT,
+    node_type TEXT,
+    count INTEGER);
+CREATE INDEX IF NOT EXISTS node_types_scene ON node_types(scene);
+CREATE INDEX IF NOT EXISTS node_types_node_type ON node_types(node_type);
+CREATE TABLE IF NOT EXISTS errors (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime INTEGER,
+    error TEXT);
+"""
+
+
+def scan_scene_metadata(maya_file_path):
+    """
+    Read everything stored in the library for a scene in a single pass.
+    :rtype: dict
+    """
+    header = read_maya_ascii_header(maya_file_path)
+    node_types = Counter()
+    dependencies = set()
+    for offset, statement in iterate_over_maya_ascii_statements(
+            maya_file_path):
+        if statement.startswith('createNode '):
+            record = parse_maya_ascii_statement(statement, offset)
+            node_types[record.node_type] += 1
+        else:
+            dependencies.update(get_statement_dependencies(statement, offset))
+    return dict(
+        path=maya_file_path,
+        header=header._asdict(),
+        node_types=dict(node_types),
+        dependencies=sorted(dependencies))
+
+
+def _scan(maya_file_path):
+    """
+    :return: metadata and error message, one of them is None.
+    :rtype: tuple[dict|None, str|None]
+    """
+    try:
+        return scan_scene_metadata(maya_file_path), None
+    except (OSError, ValueError) as e:
+        return None, f'{type(e).__name__}: {e}'
+
+
+class SceneLibrary(object):
+    def __init__(self, database_path):
+        self.database_path = database_path
+        self.connection = sqlite3.connect(database_path)
+        version, = self.connection.execute('PRAGMA user_version').fetchone()
+        if version != SCHEMA_VERSION:
+            self._drop_tables()
+        self.connection.executescript(_SCHEMA)
+        self.connection.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    def _drop_tables(self):
+        """The library is a cache: other schemas are rebuilt from scratch."""
+        tables = [t for t, in self.connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'")]
+        with self.connection:
+            for table in tables:
+                self.connection.execute(f'DROP TABLE IF EXISTS {table}')
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def list_outdated_scenes(self, maya_file_paths):
+        """Return the given scenes which are not stored or have changed."""
+        stored = dict(
+            (path, (size, mtime)) for path, size, mtime in
+            self.connection.execute(
+                'SELECT path, size, mtime FROM scenes UNION ALL '
+                'SELECT path, size, mtime FROM errors'))
+        outdated = []
+        for path in maya_file_paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if stored.get(path) != (stat.st_size, stat.st_mtime_ns):
+                outdated.append(path)
+        return outdated
+
+    def update(self, maya_file_paths, max_workers=None):
+        """
+        Scan new and modified scenes (in parallel processes) and store their
+        metadata. Scenes which can't be read are stored with their error and
+        aren't scanned again until they change. Returns the list of scanned
+        scenes.
+        """
+        outdated = self.list_outdated_scenes(maya_file_paths)
+        if not outdated:
+            return []
+        signatures = {}
+        for path in outdated:
+            stat = os.stat(path)
+            signatures[path] = stat.st_size, stat.st_mtime_ns
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(_scan, outdated, chunksize=16))
+        with self.connection:
+            for path, (metadata, error) in zip(outdated, results):
+                if metadata is None:
+                    self._store_error(path, error, *signatures[path])
+                else:
+                    self._store(metadata, *signatures[path])
+        return outdated
+
+    def _store(self, metadata, size, mtime):
+        path = metadata['path']
+        self._delete(path)
+        header = metadata['header']
+        self.connection.execute(
+            'INSERT INTO scenes VALUES (?, ?, ?, ?, ?, ?)',
+            (path, size, mtime, header['maya_version'],
+             str(header['last_modified'] or ''),
+             json.dumps(header, default=str)))
+        self.connection.executemany(
+            'INSERT INTO dependencies VALUES (?, ?, ?, ?)',
+            [(path, category, dependency,
+              resolve_dependency_path(dependency, path))
+             for category, dependency in metadata['dependencies']])
+        self.connection.executemany(
+            'INSERT INTO node_types VALUES (?, ?, ?)',
+            [(path, node_type, count)
+             for node_type, count in metadata['node_types'].items()])
+
+    def _store_error(self, path, error, size, mtime):
+        self._delete(path)
+        self.connection.execute(
+            'INSERT INTO errors VALUES (?, ?, ?, ?)',
+            (path, size, mtime, error))
+
+    def _delete(self, path):
+        for table, column in (
+                ('scenes', 'path'), ('dependencies', 'scene'),
+                ('node_types', 'scene'), ('errors', 'path')):
+            self.connection.execute(
+                f'DELETE FROM {table} WHERE {column} = ?', (path,))
+
+    def remove_missing_scenes(self):
+        missing = [
+            path for path, in self.connection.execute(
+                'SELECT path FROM scenes UNION SELECT path FROM errors')
+            if not os.path.exists(path)]
+        with self.connection:
+            for path in missing:
+                self._delete(path)
+        return missing
+
+    def list_scenes(self):
+        return [p for p, in self.connection.execute(
+            'SELECT path FROM scenes ORDER BY path')]
+
+    def list_errors(self):
+        """
+        :return: scenes which failed to be scanned and their error.
+        :rtype: dict[str, str]
+        """
+        return dict(self.connection.execute(
+            'SELECT path, error FROM errors ORDER BY path'))
+
+    def get_header(self, maya_file_path):
+        row = self.connection.execute(
+            'SELECT header FROM scenes WHERE path = ?',
+            (maya_file_path,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_node_type_counts(self, maya_file_path):
+        return dict(self.connection.execute(
+            'SELECT node_type, count FROM node_types WHERE scene = ?',
+            (maya_file_path,)))
+
+    def get_dependencies(self, maya_file_path, category=None):
+        query = 'SELECT path FROM dependencies WHERE scene = ?'
+        arguments = [maya_file_path]
+        if category:
+            query += ' AND category = ?'
+            arguments.append(category)
+        return [p for p, in self.connection.execute(query, arguments)]
+
+    def list_scenes_referencing(self, path, category=None):
+        """
+        Which scenes use this path (asset, texture, cache...).
+        A directory can be given with a trailing slash to search for any file
+        it contains.
+        """
+        is_directory = path.endswith(('/', '\\'))
+        path = resolve_dependency_path(path)
+        if is_directory:
+            path += '/'
+            query = 'SELECT DISTINCT scene FROM dependencies ' \
+                'WHERE substr(resolved_path, 1, ?) = ?'
+            arguments = [len(path), path]
+        else:
+            query = 'SELECT DISTINCT scene FROM dependencies ' \
+                'WHERE resolved_path = ?'
+            arguments = [path]
+        if category:
+            query += ' AND category = ?'
+            arguments.append(category)
+        return sorted(s for s, in self.connection.execute(query, arguments))
+
+    def list_scenes_with_node_type(self, node_type):
+        return sorted(s for s, in self.connection.execute(
+            'SELECT scene FROM node_types WHERE node_type = ?', (node_type,)))
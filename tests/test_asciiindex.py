@@ -0,0 +1,36 @@
+import os
+import stat
+
+from dwmaya import asciiindex
+from dwmaya.asciiindex import get_index_path, get_maya_ascii_index
+
+
+SCENE = '''//Maya ASCII 2022 scene
+requires maya "2022";
+createNode transform -n "grp";
+createNode file -n "file1";
+	setAttr ".ftn" -type "string" "/prod/textures/wood.png";
+// End of scene.ma
+'''
+
+
+def test_index_in_read_only_directory(tmp_path, monkeypatch):
+    directory = tmp_path / 'published'
+    directory.mkdir()
+    scene = directory / 'scene.ma'
+    scene.write_text(SCENE)
+    directory.chmod(stat.S_IRUSR | stat.S_IXUSR)
+    try:
+        if os.access(str(directory), os.W_OK):
+            # Permissions are ignored (root): fail like a locked directory.
+            def read_only_open(*args, **kwargs):
+                raise PermissionError(13, 'Permission denied')
+            monkeypatch.setattr(asciiindex.gzip, 'open', read_only_open)
+
+        index = get_maya_ascii_index(str(scene))
+
+        assert [n.name for n in index.nodes] == ['grp', 'file1']
+        assert not os.path.exists(get_index_path(str(scene)))
+        assert os.listdir(str(directory)) == ['scene.ma']
+    finally:
+        directory.chmod(stat.S_IRWXU)
@@ -0,0 +1,28 @@
+from dwmaya.dependencies import get_statement_dependencies
+
+
+def _string_attribute(value):
+    return 'setAttr ".ftn" -type "string" "%s"' % value
+
+
+def test_relative_path_with_single_separator():
+    statement = _string_attribute('textures/wood.png')
+    assert get_statement_dependencies(statement) == [
+        ('textures', 'textures/wood.png')]
+
+
+def test_sourceimages_path():
+    statement = _string_attribute('sourceimages/x.exr')
+    assert get_statement_dependencies(statement) == [
+        ('textures', 'sourceimages/x.exr')]
+
+
+def test_absolute_path():
+    statement = _string_attribute('/prod/textures/wood.png')
+    assert get_statement_dependencies(statement) == [
+        ('textures', '/prod/textures/wood.png')]
+
+
+def test_not_paths():
+    for value in ('wood.png', 'textures/wood', '1/2.5', 'a/b.png\nc'):
+        assert get_statement_dependencies(_string_attribute(value)) == []